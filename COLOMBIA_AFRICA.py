@@ -1,130 +1,251 @@
 #!/usr/bin/env python3
 import pandas as pd
+import numpy as np
 import os
+from normalized_io import read_normalized
+from ledger_index import load_ledger_index
+from csv_stream import ChunkedCSVWriter
+from extraction_cache import ExtractionCache
+from instrumentation import NULL_TIMER, FileTimer, TimingReport, add_instrumentation_args, profiled
+from prefetch import prefetched
+import argparse
+
+# Define column mappings for merging duplicates
+DUPLICATE_COLUMN_PAIRS = {
+    "CHLORIDE__RANDOM_URINE__Urine_": "CHLORIDE__RANDOM_URINE",
+    "CREATININE__RANDOM_URINE__Urine_": "CREATININE__RANDOM_URINE",
+    "OSMOLALITY__RANDOM_URINE__Urine_": "OSMOLALITY__RANDOM_URINE",
+    "POTASSIUM__RANDOM_URINE__Urine_": "POTASSIUM__RANDOM_URINE",
+    "SODIUM__RANDOM_URINE__Urine_": "SODIUM__RANDOM_URINE",
+    "URINE__PROTEIN__Urine_": "URINE__PROTEIN",
+    "URIC_ACID__URINE__Urine_": "URIC_ACID__URINE",
+    "URINE_RANDOM_CALCIUM__Urine_": "URINE_RANDOM_CALCIUM",
+    "URINE_PHOSPHATE__Urine_": "URINE_PHOSPHATE",
+    "URINE_MICROALBUMIN__Urine_": "URINE_MICROALBUMIN",
+    "URINE_UREA__Urine_": "URINE_UREA",
+    "APOLIPOPROTEIN_B": "APOLIPOPROTEIN_B__Serum_",
+    "APOLIPOPROTEINS_A1": "APOLIPOPROTEINS_A1__Serum_",
+    "OSMOLALITY__SERUM": "OSMOLALITY__SERUM__Serum_",
+    "CALCIUM__SERUM": "CALCIUM__SERUM__Serum_"
+}
+
+PREFETCH_DEPTH = 2  # normalized files read ahead of the one being extracted
+METADATA_OFFSET = -2  # column shift of the exported sheets against metadata_fields(0)
+
+# Define calcium variants to consolidate
+CALCIUM_VARIANTS = [
+    "CALCIUM__SERUM",
+    "CALCIUM__SERUM__Serum_",
+    "CALCIUM__SERUM_Note__Corrected_for_serum_albumin__2_08",
+    "CALCIUM__SERUM__Serum__Note__Corrected_serum_calcium_for_low_albumin___2_11_mmol_L",
+    "CALCIUM__SERUM__Serum__Note__Corrected_calcium_for_albumin_is_2_15_mmol_L"
+]
+
+def metadata_fields(offset):
+    """Fixed (row, col) positions of the metadata cells, shifted by offset."""
+    return {
+        "Name": (2, 5 + offset),
+        "MRN": (4, 5 + offset),
+        "Lab No": (6, 5 + offset),
+        "Referred By": (8, 5 + offset),
+        "Age": (2, 12 + offset),
+        "Gender": (2, 16 + offset),
+        "Collected On": (6, 12 + offset),
+        "Received On": (6, 16 + offset),
+        "Reported On": (8, 12 + offset),
+    }
 
-def process_files_with_normalization(normalization_log_path, normalized_files_folder, output_csv):
-    # Read normalization log file
-    normalization_log = pd.read_csv(normalization_log_path)
-    unique_files = normalization_log['File Name'].unique()
+def output_columns(ledger_index):
+    """Column schema fixed up front from the ledger (used by the streaming writer)."""
+    tests = sorted(set().union(*ledger_index.values()))
+    return ["File Name"] + list(metadata_fields(0)) + tests + ["Calcium Corrected Serum"]
+
+def extract_file_row(df, file_name, test_names, offset, error_logs, timer=NULL_TIMER):
+    """Build the combined-output row for one loaded normalized file."""
+    metadata = {"File Name": file_name}
+
+    # Extract metadata and handle missing values
+    with timer.phase("extract"):
+        for key, (row, col) in metadata_fields(offset).items():
+            try:
+                metadata[key] = df.iat[row, col]
+            except IndexError:
+                metadata[key] = "Missing"
+                error_logs.append(f"Missing '{key}' in file: {file_name}")
+
+    # Extract test results (test_names comes from the ledger index): one pass over the
+    # label block (rows 14+, first three columns) as a NumPy view, then gather the
+    # result cells 4 columns over with fancy indexing
+    n_cols = df.shape[1]
+    with timer.phase("scan"):
+        values = df.to_numpy(dtype=object)
+        labels = values[14:, :3]  # Start at row 14, search in the first three columns
+        stripped = [v.strip() if isinstance(v, str) else None for v in labels.ravel()]
+        hit = np.fromiter((v in test_names for v in stripped), dtype=bool, count=len(stripped))
+        hit_rows, hit_cols = np.nonzero(hit.reshape(labels.shape))  # row-major, like the cell walk
+    with timer.phase("extract"):
+        result_cols = hit_cols + 4  # Assuming result is 3 columns over
+        in_bounds = result_cols < n_cols  # Ensure the column exists
+        hit_rows, hit_cols, result_cols = hit_rows[in_bounds], hit_cols[in_bounds], result_cols[in_bounds]
+        names = [stripped[r * labels.shape[1] + c] for r, c in zip(hit_rows, hit_cols)]
+        metadata.update(zip(names, values[hit_rows + 14, result_cols]))  # later hits win
+        if n_cols < 3:
+            error_logs.append(f"Sheet has {n_cols} columns, need at least 3 for test labels, in file: {file_name}")
+
+        # Merge duplicate columns
+        for old_col, new_col in DUPLICATE_COLUMN_PAIRS.items():
+            if old_col in metadata and new_col in metadata:
+                metadata[new_col] = metadata[old_col] or metadata[new_col]  # Prioritize non-empty
+                metadata.pop(old_col, None)  # Remove old column
+
+        # Consolidate calcium variants
+        metadata["Calcium Corrected Serum"] = None
+        for variant in CALCIUM_VARIANTS:
+            if variant in metadata and metadata[variant] != "Missing":
+                metadata["Calcium Corrected Serum"] = metadata[variant]
+                metadata.pop(variant, None)
+
+    return metadata
+
+def extractor_config(offset):
+    """Everything besides the file and its ledger rows that shapes an extracted row."""
+    return (offset, metadata_fields(offset), DUPLICATE_COLUMN_PAIRS, CALCIUM_VARIANTS)
+
+def process_files_with_normalization(normalization_log_path, normalized_files_folder, output_csv,
+                                     stream=False, chunk_rows=1000, cache_path=None,
+                                     error_log_path="error_log.txt", timings_path=None, prefetch=PREFETCH_DEPTH):
+    """
+    Combine the normalized files listed in the ledger into one wide CSV.
+    With stream=True the column schema is fixed from the ledger up front and rows are
+    appended to output_csv in chunks of chunk_rows, so memory stays flat; the columns
+    then include every ledger test name (sorted) rather than only those found.
+    With cache_path, rows (and their error lines) of files whose content and ledger rows
+    are unchanged since an earlier run are taken from that cache instead of re-extracted.
+    timings_path writes per-file read/scan/extract/write seconds (see instrumentation.py).
+    prefetch is how many of the following files are read ahead on threads (0 = none).
+    """
+    # Read normalization log file once, indexed as {file name: frozenset of New Names}
+    ledger_index = load_ledger_index(normalization_log_path)
 
     # Initialize a DataFrame to store results
     all_results = []
     error_logs = []
-
-    # Define column mappings for merging duplicates
-    duplicate_column_pairs = {
-        "CHLORIDE__RANDOM_URINE__Urine_": "CHLORIDE__RANDOM_URINE",
-        "CREATININE__RANDOM_URINE__Urine_": "CREATININE__RANDOM_URINE",
-        "OSMOLALITY__RANDOM_URINE__Urine_": "OSMOLALITY__RANDOM_URINE",
-        "POTASSIUM__RANDOM_URINE__Urine_": "POTASSIUM__RANDOM_URINE",
-        "SODIUM__RANDOM_URINE__Urine_": "SODIUM__RANDOM_URINE",
-        "URINE__PROTEIN__Urine_": "URINE__PROTEIN",
-        "URIC_ACID__URINE__Urine_": "URIC_ACID__URINE",
-        "URINE_RANDOM_CALCIUM__Urine_": "URINE_RANDOM_CALCIUM",
-        "URINE_PHOSPHATE__Urine_": "URINE_PHOSPHATE",
-        "URINE_MICROALBUMIN__Urine_": "URINE_MICROALBUMIN",
-        "URINE_UREA__Urine_": "URINE_UREA",
-        "APOLIPOPROTEIN_B": "APOLIPOPROTEIN_B__Serum_",
-        "APOLIPOPROTEINS_A1": "APOLIPOPROTEINS_A1__Serum_",
-        "OSMOLALITY__SERUM": "OSMOLALITY__SERUM__Serum_",
-        "CALCIUM__SERUM": "CALCIUM__SERUM__Serum_"
-    }
-
-    # Define calcium variants to consolidate
-    calcium_variants = [
-        "CALCIUM__SERUM",
-        "CALCIUM__SERUM__Serum_",
-        "CALCIUM__SERUM_Note__Corrected_for_serum_albumin__2_08",
-        "CALCIUM__SERUM__Serum__Note__Corrected_serum_calcium_for_low_albumin___2_11_mmol_L",
-        "CALCIUM__SERUM__Serum__Note__Corrected_calcium_for_albumin_is_2_15_mmol_L"
-    ]
-
-    for file_name in unique_files:
-        file_path = os.path.join(normalized_files_folder, file_name)
+    writer = ChunkedCSVWriter(output_csv, output_columns(ledger_index), chunk_rows) if stream else None
+    # every ledger file is read with METADATA_OFFSET, so one config covers the run
+    cache = ExtractionCache(cache_path, "colombia", extractor_config(METADATA_OFFSET)) if cache_path else None
+    report = TimingReport("COLOMBIA_AFRICA") if timings_path else None
+
+    # cache lookups happen here, in this thread (SQLite), so only the misses are read ahead
+    file_names = list(ledger_index)
+    keys, cached = {}, {}
+    if cache is not None:
+        for file_name in file_names:
+            if file_name.endswith(".csv"):
+                keys[file_name] = cache.key(os.path.join(normalized_files_folder, file_name), ledger_index[file_name])
+                cached[file_name] = cache.get(keys[file_name])
+
+    def load(file_name):
+        """Read one normalized file (on a prefetch thread); cached and unsupported files are not read."""
+        if not file_name.endswith(".csv") or cached.get(file_name) is not None:
+            return None
+        # columnar copy if Extract_all_columns wrote one, else the CSV
+        return read_normalized(os.path.join(normalized_files_folder, file_name))
+
+    for file_name, loaded in prefetched(load, file_names, prefetch):
+        test_names = ledger_index[file_name]
         print(f"Processing file: {file_name}")
+        timer = FileTimer(file_name) if report is not None else NULL_TIMER
 
         try:
-            # Load the file
-            if file_name.endswith(".csv"):
-                df = pd.read_csv(file_path, header=None)
-            else:
+            if not file_name.endswith(".csv"):
                 raise ValueError(f"Unsupported file format: {file_name}")
 
-            # Extract metadata (consider offset for structure variations)
-            offset = 0 if file_name not in normalization_log['File Name'].tolist() else -2
-            metadata = {"File Name": file_name}
-
-            # Extract metadata and handle missing values
-            metadata_fields = {
-                "Name": (2, 5 + offset),
-                "MRN": (4, 5 + offset),
-                "Lab No": (6, 5 + offset),
-                "Referred By": (8, 5 + offset),
-                "Age": (2, 12 + offset),
-                "Gender": (2, 16 + offset),
-                "Collected On": (6, 12 + offset),
-                "Received On": (6, 16 + offset),
-                "Reported On": (8, 12 + offset),
-            }
-
-            for key, (row, col) in metadata_fields.items():
-                try:
-                    metadata[key] = df.iat[row, col]
-                except IndexError:
-                    metadata[key] = "Missing"
-                    error_logs.append(f"Missing '{key}' in file: {file_name}")
-
-            # Extract test results
-            test_names = normalization_log[normalization_log['File Name'] == file_name]['New Name'].tolist()
-            for row in range(14, df.shape[0]):  # Start at row 14
-                try:
-                    for col in range(3):  # Search in the first three columns
-                        test_name = df.iat[row, col]
-                        if isinstance(test_name, str) and test_name.strip() in test_names:
-                            result_col = col + 4  # Assuming result is 3 columns over
-                            if result_col < df.shape[1]:  # Ensure the column exists
-                                result = df.iat[row, result_col]
-                                metadata[test_name.strip()] = result
-                except Exception as e:
-                    error_logs.append(f"Error processing row {row} in file {file_name}: {e}")
-
-            # Merge duplicate columns
-            for old_col, new_col in duplicate_column_pairs.items():
-                if old_col in metadata and new_col in metadata:
-                    metadata[new_col] = metadata[old_col] or metadata[new_col]  # Prioritize non-empty
-                    metadata.pop(old_col, None)  # Remove old column
-
-            # Consolidate calcium variants
-            metadata["Calcium Corrected Serum"] = None
-            for variant in calcium_variants:
-                if variant in metadata and metadata[variant] != "Missing":
-                    metadata["Calcium Corrected Serum"] = metadata[variant]
-                    metadata.pop(variant, None)
-
-            # Append metadata to the results list
-            all_results.append(metadata)
+            if cached.get(file_name) is not None:
+                metadata, file_errors = cached[file_name]
+                timer.note(cached=True)
+            else:
+                # Load the file; read ahead, so "read" is only the time spent waiting for it
+                with timer.phase("read"):
+                    df = loaded.result()
+                timer.note(rows=df.shape[0], cols=df.shape[1])
+
+                file_errors = []
+                metadata = extract_file_row(df, file_name, test_names, METADATA_OFFSET, file_errors, timer)
+                if cache is not None:
+                    cache.put(keys[file_name], (metadata, file_errors))
+            error_logs.extend(file_errors)
+
+            # Append metadata to the results list (or stream it out)
+            with timer.phase("write"):
+                if writer is not None:
+                    writer.write_row(metadata)
+                else:
+                    all_results.append(metadata)
 
         except Exception as e:
             print(f"Error processing file {file_name}: {e}")
             error_logs.append(f"File-level error for {file_name}: {e}")
-
-    # Convert results to DataFrame and save
-    results_df = pd.DataFrame(all_results)
-    results_df.to_csv(output_csv, index=False)
+            timer.note(error=str(e))
+        if report is not None:
+            report.add(timer.record())
+
+    if cache is not None:
+        cache.close()
+        print(cache.summary())
+
+    # Convert results to DataFrame and save (timed as one more record, named after the output)
+    timer = FileTimer(output_csv) if report is not None else NULL_TIMER
+    with timer.phase("write"):
+        if writer is not None:
+            writer.close()
+        else:
+            results_df = pd.DataFrame(all_results)
+            results_df.to_csv(output_csv, index=False)
     print(f"Combined results successfully saved to {output_csv}")
 
     # Log errors to a separate file
-    with open("error_log.txt", "w") as error_file:
+    with open(error_log_path, "w") as error_file:
         for error in error_logs:
             error_file.write(f"{error}\n")
-    print("Error log saved to error_log.txt")
-
-
-# Paths and Parameters
-normalization_log_path = "normalization_log_SECOND.csv"  # Path to the normalization log
-normalized_files_folder = "./normalized_files"  # Folder with normalized files
-output_csv = "combined_output.csv"  # Output file for combined results
-
-# Run the function
-process_files_with_normalization(normalization_log_path, normalized_files_folder, output_csv)
-
+    print(f"Error log saved to {error_log_path}")
+
+    if report is not None:
+        report.add(timer.record())
+        report.write(timings_path)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Combine normalized lab files into one wide table.")
+    parser.add_argument("--ledger", default="normalization_log_SECOND.csv",
+                        help="normalization ledger listing the files and their tests (default: %(default)s)")
+    parser.add_argument("--normalized-dir", default="./normalized_files",
+                        help="folder with the normalized files (default: %(default)s)")
+    parser.add_argument("--output", default="combined_output.csv",
+                        help="combined wide table (default: %(default)s)")
+    parser.add_argument("--error-log", default="error_log.txt",
+                        help="where per-file problems are written (default: %(default)s)")
+    parser.add_argument("--stream", action="store_true",
+                        help="append rows to the output in chunks instead of holding them all in memory")
+    parser.add_argument("--chunk-rows", type=int, default=1000,
+                        help="rows per chunk in --stream mode (default: %(default)s)")
+    parser.add_argument("--cache", metavar="FILE",
+                        help="SQLite extraction cache; unchanged files are not re-extracted")
+    parser.add_argument("--prefetch", type=int, default=PREFETCH_DEPTH, metavar="N",
+                        help="read the next N files on background threads while one is extracted; "
+                             "0 reads them one at a time (default: %(default)s)")
+    add_instrumentation_args(parser)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    # Paths and Parameters
+    normalization_log_path = args.ledger  # Path to the normalization log
+    normalized_files_folder = args.normalized_dir  # Folder with normalized files
+    output_csv = args.output  # Output file for combined results
+
+    # Run the function
+    with profiled(args.profile):
+        process_files_with_normalization(normalization_log_path, normalized_files_folder, output_csv,
+                                         stream=args.stream, chunk_rows=args.chunk_rows,
+                                         cache_path=args.cache, error_log_path=args.error_log,
+                                         timings_path=args.timings, prefetch=args.prefetch)
@@ -1,8 +1,20 @@
 #!/usr/bin/env python3
-import os, re, glob
+import os, re, argparse
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial, lru_cache
 import pandas as pd
 import numpy as np
 from pathlib import Path
+from normalized_io import read_normalized, list_normalized
+from ledger_index import load_ledger_index
+from csv_stream import ChunkedCSVWriter
+from compact_frames import TABLE_FORMATS, ChunkedParquetWriter, compact_frame, parquet_available, write_table
+from extraction_cache import ExtractionCache
+from prefetch import prefetched
+from sheet_layouts import TemplateCache, layout_fingerprint
+from instrumentation import (NULL_TIMER, FileTimer, TimingReport, add_instrumentation_args, collect_timed,
+                             profiled, run_timed)
+from unit_parsing import split_value_and_unit, unit_cache_info, configure_unit_cache  # shared with UNITS_Retained.py
 
 # -------------------- CONFIG --------------------
 INPUT_DIR   = "./normalized_files"            # normalized CSVs live here
@@ -12,8 +24,14 @@ ERROR_LOG   = "extract_00xx_errors.log"       # human-readable issues
 LABEL_SCAN_COLS = 8                           # scan first N columns for labels
 DEFAULT_OFFSETS  = [4, 5, 6, 7]               # general offsets to probe
 PH_OFFSETS       = [5, 7, 6, 4]               # pH quirk observed in zero-led files
+STREAM_CHUNK_ROWS = 1000                      # rows per append in --stream mode
+PREFETCH_DEPTH = 2                            # files read ahead in a serial run
+UNIT_CACHE_SIZE  = 1 << 16                    # distinct (column class, raw value) pairs kept
 # ------------------------------------------------
 
+# per template: canonical label -> offset its result was found at (each worker process keeps its own)
+LAYOUTS = TemplateCache()
+
 # ------------ helpers: result detection ------------
 num_like = re.compile(r"^[\s]*[+-]?\d{1,3}(?:,\d{3})*(?:\.\d+)?(?:[eE][+-]?\d+)?")
 qual_set = {"NEGATIVE","POSITIVE","TRACE","NEG","POS","NIL","NONE","ABSENT","PRESENT"}
@@ -32,6 +50,46 @@ def is_resultish(s):
     except Exception:
         return False
 
+@lru_cache(maxsize=1 << 16)
+def first_token_numeric(s2):
+    """is_resultish's rescue branch: first token parses as a float (e.g. "5.6 mmol/L")."""
+    try:
+        float(s2.split()[0].replace(",",""))
+        return True
+    except Exception:
+        return False
+
+def result_mask(values):
+    """
+    is_resultish for every cell of values at once, as a boolean array of the same shape.
+    Each distinct cell text is tested once: num_like via str.match, qualitative words via
+    isin(qual_set), and only the leftovers go through the (memoized) first-token rescue.
+    """
+    codes, uniques = pd.factorize(values.ravel())  # missing cells get code -1
+    text = pd.Series(uniques, dtype=object).map(str).str.strip()
+    ok = (text != "") & (text.str.lower() != "nan")
+    num = text.str.match(num_like.pattern)
+    qual = text.str.upper().isin(qual_set)
+    hit = (ok & (num | qual)).to_numpy(dtype=bool, copy=True)
+    for i in np.flatnonzero(ok.to_numpy(dtype=bool) & ~hit):
+        hit[i] = first_token_numeric(text.iat[i])
+    mask = np.append(hit, False)[codes]  # code -1 -> trailing False
+    return mask.reshape(values.shape)
+
+def cached_offset_holds(values, r, c, offsets, dc):
+    """
+    Whether probing offsets from (r, c) stops at dc: the cell dc over is a result and no
+    offset probed before it is. Then a template's cached offset gives exactly what the
+    generic probe would, from a few cells instead of result_mask over the whole sheet.
+    """
+    cols = values.shape[1]
+    for d in offsets:
+        found = c + d < cols and is_resultish(values[r, c + d])
+        if d == dc or found:
+            return d == dc and found
+    return False
+
+@lru_cache(maxsize=1 << 16)
 def canonicalize_label(lbl: str) -> str:
     """Collapse trivial suffix variants (e.g., __Urine_) and tidy underscores."""
     s = str(lbl).strip()
@@ -39,95 +97,6 @@ def canonicalize_label(lbl: str) -> str:
     s = re.sub(r"_+", "_", s)
     return s
 
-# ------------ unit split (matches your previous logic) ------------
-num_regex = re.compile(r"""
-    ^\s*
-    (?P<num>[+-]?\d{1,3}(?:,\d{3})*|\d+)
-    (?:\.\d+)?          # decimals
-    (?:[eE][+-]?\d+)?   # scientific
-""", re.VERBOSE)
-
-UNIT_MAP = {
-    "mmol/l": "mmol/L",
-    "μmol/l": "umol/L",
-    "umol/l": "umol/L",
-    "iu/l":   "IU/L",
-    "mg/dl":  "mg/dL",
-    "g/dl":   "g/dL",
-    "g/l":    "g/L",
-    "mosmol/kg": "mOsmol/kg",
-    "mosm/kg":   "mOsmol/kg",
-    "mosmolkg":  "mOsmol/kg",
-}
-
-def clean_numeric(s):
-    if pd.isna(s): return np.nan
-    s = str(s).strip()
-    m = num_regex.match(s)
-    if not m:
-        # ratio like "1.97 :1"
-        ratio_match = re.match(r"^\s*([+-]?\d+(?:\.\d+)?)\s*:?\s*1\s*$", s)
-        if ratio_match:
-            return float(ratio_match.group(1))
-        return np.nan
-    num = m.group(0).replace(",", "")
-    try:
-        return float(num)
-    except Exception:
-        return np.nan
-
-def normalize_unit(col_name, raw_value_str):
-    if raw_value_str is None: return "no_units"
-    unit = ""
-    s = str(raw_value_str).strip()
-    m = num_regex.match(s)
-    unit = s[m.end():] if m else s
-
-    unit = unit.strip()
-    unit = unit.replace(".", " ").replace("·", " ")
-    unit = re.sub(r"\s+", " ", unit)
-    unit = unit.replace(" /", "/").replace("/ ", "/")
-    unit = unit.replace(" l", "/L").replace(" L", "/L")
-    unit = unit.lower().replace("µ","u").replace("umol/ l","umol/l").strip(" :;")
-
-    # special columns
-    if col_name.lower().startswith("ph"):
-        return "unitless"
-    if "ratio" in col_name.lower() or re.search(r"\d\s*:\s*1$", s):
-        return "ratio"
-    if unit in ("", None):
-        return "no_units"
-
-    # common rescues
-    unit = unit.replace("mg dl", "mg/dl").replace("g dl","g/dl")
-
-    if unit in UNIT_MAP: return UNIT_MAP[unit]
-    if "umol" in unit: return "umol/L"
-    if "mmol" in unit: return "mmol/L"
-    if "iu"   in unit: return "IU/L"
-    if "mg" in unit and "dl" in unit: return "mg/dL"
-    if "g"  in unit and "/l" in unit: return "g/L"
-    if "osmol" in unit: return "mOsmol/kg"
-
-    if re.fullmatch(r"(negative|pos|positive|trace|tr|nil|none)", unit.strip(), flags=re.I):
-        return "qual"
-
-    return unit
-
-def split_value_and_unit(col_name, s):
-    if pd.isna(s):
-        return np.nan, "no_units"
-    s = str(s).strip()
-    val = clean_numeric(s)
-    unit = normalize_unit(col_name, s)
-    if pd.isna(val):
-        if unit == "unitless":
-            return np.nan, "unitless"
-        return np.nan, "qual" if unit not in ("no_units",) else "no_units"
-    if unit in ("", "no_units"):
-        unit = "no_units"
-    return val, unit
-
 # ------------- metadata extraction (Name / Age / Gender) -------------
 META_LABELS = {
     "Name":   ["name"],
@@ -135,99 +104,133 @@ META_LABELS = {
     "Gender": ["gender","sex"]
 }
 
-def grab_meta(df: pd.DataFrame, key: str):
+# every keyword -> its key; one lookahead regex finds all (even overlapping) keywords in a cell
+META_KEYWORDS = {k: key for key, kws in META_LABELS.items() for k in kws}
+META_PATTERN = re.compile("(?=(" + "|".join(map(re.escape, META_KEYWORDS)) + "))")
+
+def is_blank(v):
+    return v is None or (isinstance(v, float) and np.isnan(v)) or not str(v).strip()
+
+def value_near(values, r, c):
+    """Metadata value for a label at (r, c): same-row offsets [1..8], then next-row anywhere."""
+    rows, cols = values.shape
+    # same row to right
+    for cc in range(c + 1, min(c + 9, cols)):
+        if not is_blank(values[r, cc]):
+            return str(values[r, cc]).strip()
+    # next row anywhere
+    if r+1 < rows:
+        for v in values[r+1]:
+            if not is_blank(v):
+                return str(v).strip()
+    return None
+
+def scan_sheet(values, exp_canon):
     """
-    Find Name/Age/Gender in first LABEL_SCAN_COLS columns.
-    Try same-row offsets [1..8], then next-row anywhere.
+    One row-major sweep over the first LABEL_SCAN_COLS columns that does both jobs:
+      - Name/Age/Gender: first label (<= 20 chars, keyword substring) that has a value
+        near it, per key -- same first-match semantics as a separate scan per key;
+      - expected biomarker labels: (row, col, label, canon) for every cell whose
+        canonical form is in exp_canon, in scan order.
     """
-    rows, cols = df.shape
-    keys = META_LABELS[key]
+    rows, cols = values.shape
+    meta = dict.fromkeys(META_LABELS)
+    pending = set(META_LABELS)
+    hits = []
     for r in range(rows):
         for c in range(min(LABEL_SCAN_COLS, cols)):
-            raw = df.iat[r, c]
-            if raw is None or (isinstance(raw, float) and np.isnan(raw)): 
+            raw = values[r, c]
+            if raw is None or (isinstance(raw, float) and np.isnan(raw)):
                 continue
             s = str(raw).strip()
             if not s: continue
-            if any(k in s.lower() for k in keys) and len(s) <= 20:
-                # same row to right
-                for dc in range(1, 9):
-                    cc = c + dc
-                    if cc < cols:
-                        v = df.iat[r, cc]
-                        if v is not None and (not (isinstance(v, float) and np.isnan(v))) and str(v).strip():
-                            return str(v).strip()
-                # next row anywhere
-                if r+1 < rows:
-                    for cc in range(cols):
-                        v = df.iat[r+1, cc]
-                        if v is not None and (not (isinstance(v, float) and np.isnan(v))) and str(v).strip():
-                            return str(v).strip()
-    return None
+            if pending and len(s) <= 20:
+                keys = {META_KEYWORDS[m.group(1)] for m in META_PATTERN.finditer(s.lower())} & pending
+                if keys:
+                    v = value_near(values, r, c)
+                    if v is not None:
+                        for key in keys:
+                            meta[key] = v
+                        pending -= keys
+            canon = canonicalize_label(s)
+            if canon in exp_canon:  # only pick labels that normalization log says we expect
+                hits.append((r, c, s, canon))
+    return meta, hits
 
 # ------------- core extraction per file -------------
-def extract_from_one_file(path: str, expected_tests: list, warn_list: list):
+def read_sheet(path):
+    """A normalized file as text cells; bad lines are skipped."""
+    return read_normalized(path, dtype=str, engine="python", on_bad_lines="skip")
+
+def extract_from_one_file(path: str, expected_tests: list, warn_list: list, timer=NULL_TIMER, read=None):
     """
     expected_tests: list of 'New Name' strings from normalization log for this file.
+    read: optional callable returning the already-requested frame (a prefetch future's result).
     Returns meta dict + {biomarker: (value_str)} raw (split later).
     """
     try:
-        df = pd.read_csv(path, header=None, dtype=str, engine="python", on_bad_lines="skip")
+        with timer.phase("read"):
+            df = read() if read is not None else read_sheet(path)
     except Exception as e:
         warn_list.append(f"READ_FAIL: {os.path.basename(path)} -> {e}")
         return {"file_name": os.path.basename(path), "Name": None, "Age": None, "Gender": None}, {}
 
     rows, cols = df.shape
-    meta = {
-        "file_name": os.path.basename(path),
-        "Name":   grab_meta(df, "Name"),
-        "Age":    grab_meta(df, "Age"),
-        "Gender": grab_meta(df, "Gender"),
-    }
-    for k in ["Name","Age","Gender"]:
-        if meta[k] is None:
-            warn_list.append(f"META_MISSING: {os.path.basename(path)} -> {k} not found")
-
-    # quick detect: some zero-led files have two empty leading columns; but since we scan
-    # fixed first LABEL_SCAN_COLS for labels, this is robust either way.
+    timer.note(rows=rows, cols=cols)
+    values = df.to_numpy(dtype=object)
 
     # build a fast lookup set for labels we expect
     exp = [t for t in expected_tests if isinstance(t, str)]
     exp_canon = {canonicalize_label(t): t for t in exp}  # canon -> original
 
-    found = {}  # canon -> value string
+    # quick detect: some zero-led files have two empty leading columns; but since we scan
+    # fixed first LABEL_SCAN_COLS for labels, this is robust either way.
+    with timer.phase("scan"):
+        found_meta, label_hits = scan_sheet(values, exp_canon)
 
-    for r in range(rows):
-        for c in range(min(LABEL_SCAN_COLS, cols)):
-            raw = df.iat[r, c]
-            if raw is None or (isinstance(raw, float) and np.isnan(raw)): 
-                continue
-            lbl = str(raw).strip()
-            if not lbl: 
-                continue
-            canon = canonicalize_label(lbl)
-            if canon not in exp_canon:
-                continue  # only pick labels that normalization log says we expect
+    meta = {"file_name": os.path.basename(path), **found_meta}
+    for k in ["Name","Age","Gender"]:
+        if meta[k] is None:
+            warn_list.append(f"META_MISSING: {os.path.basename(path)} -> {k} not found")
 
+    found = {}  # canon -> value string
+    with timer.phase("extract"):
+        # sheets of a template seen before start from the offsets resolved on it
+        layout = LAYOUTS.layout(layout_fingerprint(values, LABEL_SCAN_COLS)) if label_hits else None
+        resultish = None  # result_mask, computed only once a label needs the generic probe
+
+        for r, c, lbl, canon in label_hits:
             # offsets choice (pH special-case)
             offsets = PH_OFFSETS if canon.lower().startswith("ph") else DEFAULT_OFFSETS
 
             val = None
             used_offset = None
-            # same row
-            for dc in offsets:
-                cc = c + dc
-                if cc < cols and is_resultish(df.iat[r, cc]):
-                    val = str(df.iat[r, cc]).strip()
-                    used_offset = dc
-                    break
-            # next-row fallback
-            if val is None and r+1 < rows:
-                for cc in range(cols):
-                    if is_resultish(df.iat[r+1, cc]):
-                        val = str(df.iat[r+1, cc]).strip()
-                        used_offset = None
+            dc = layout.get(canon) if layout is not None else None
+            if dc is not None and cached_offset_holds(values, r, c, offsets, dc):
+                val = str(values[r, c + dc]).strip()
+                used_offset = dc
+                LAYOUTS.hits += 1
+            else:
+                if resultish is None:
+                    resultish = result_mask(values)
+                # same row
+                for dc in offsets:
+                    cc = c + dc
+                    if cc < cols and resultish[r, cc]:
+                        val = str(values[r, cc]).strip()
+                        used_offset = dc
                         break
+                # next-row fallback
+                if val is None and r+1 < rows:
+                    next_hits = np.flatnonzero(resultish[r+1])
+                    if next_hits.size:
+                        cc = next_hits[0]
+                        val = str(values[r+1, cc]).strip()
+                        used_offset = None
+                if layout is not None:
+                    LAYOUTS.misses += 1
+                    if used_offset is not None:
+                        layout[canon] = used_offset
 
             if val is None:
                 warn_list.append(f"NO_VALUE: {os.path.basename(path)} label='{lbl}' row={r} col={c}")
@@ -236,6 +239,10 @@ def extract_from_one_file(path: str, expected_tests: list, warn_list: list):
             # keep first found
             if canon not in found:
                 found[canon] = val
+                # audit trail for values not taken from the first offset probed
+                if used_offset != offsets[0]:
+                    where = "next_row" if used_offset is None else f"+{used_offset}"
+                    warn_list.append(f"OFFSET: {os.path.basename(path)} label='{lbl}' row={r} col={c} used_offset={where}")
 
     # special pH warning
     if not any(k.lower().startswith("ph") for k in found.keys()):
@@ -243,35 +250,106 @@ def extract_from_one_file(path: str, expected_tests: list, warn_list: list):
 
     return meta, found
 
+def build_row(meta, found_raw, cols, biomarker_list):
+    """One output row: metadata plus value/unit pairs for every biomarker in the schema."""
+    row = {c: np.nan for c in cols}
+    row.update(meta)  # file_name, Name, Age, Gender
+
+    for b in biomarker_list:
+        v_raw = found_raw.get(b)
+        if v_raw is not None:
+            val, unit = split_value_and_unit(v_raw, b)
+            row[b] = val
+            row[f"{b}_UNITS"] = unit
+        else:
+            row[b] = np.nan
+            row[f"{b}_UNITS"] = "no_units"
+    return row
+
+def extractor_config():
+    """Everything besides the file and its expected tests that shapes an extraction."""
+    return (LABEL_SCAN_COLS, DEFAULT_OFFSETS, PH_OFFSETS, META_LABELS, num_like.pattern, sorted(qual_set))
+
+def process_one_file(path, expected, extracted=None, *, cols, biomarker_list, read=None, timer=NULL_TIMER):
+    """
+    Extract one file into an output row; returns (row, warnings, extracted), where
+    extracted = (meta, found_raw, warnings) is what the extraction cache stores.
+    A cached extraction can be passed in to skip reading the file. Runs in worker processes.
+    """
+    if extracted is None:
+        warns = []
+        meta, found_raw = extract_from_one_file(path, expected, warns, timer, read)
+        extracted = (meta, found_raw, warns)
+    else:
+        timer.note(cached=True)
+    meta, found_raw, warns = extracted
+    with timer.phase("extract"):
+        row = build_row(meta, found_raw, cols, biomarker_list)
+    return row, warns, extracted
+
 # ------------- main -------------
-def main():
-    # files: strictly names that start with '0' and end with .csv
-    files = sorted([p for p in glob.glob(os.path.join(INPUT_DIR, "*.csv"))
-                    if os.path.basename(p).startswith("0")])
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Extract zero-led (Dassanach) files into one wide table.")
+    ap.add_argument("--input-dir", default=INPUT_DIR,
+                    help="folder with the normalized files (default: %(default)s)")
+    ap.add_argument("--ledger", default=NORMAL_LOG,
+                    help="normalization ledger with the expected tests per file (default: %(default)s)")
+    ap.add_argument("--output", default=OUT_CSV,
+                    help="combined wide table (default: %(default)s)")
+    ap.add_argument("--error-log", default=ERROR_LOG,
+                    help="human-readable issues (default: %(default)s)")
+    ap.add_argument("--stream", action="store_true",
+                    help="append rows to the output in chunks instead of building the whole table in memory")
+    ap.add_argument("--chunk-rows", type=int, default=STREAM_CHUNK_ROWS,
+                    help="rows per chunk in --stream mode (default: %(default)s)")
+    ap.add_argument("--format", choices=list(TABLE_FORMATS), default="csv",
+                    help="output format; parquet keeps the compact dtypes (categorical units, float32 "
+                         "values) and replaces the output's suffix with .parquet (default: %(default)s)")
+    ap.add_argument("--jobs", type=int, default=1,
+                    help="worker processes extracting files in parallel (default: 1, serial)")
+    ap.add_argument("--prefetch", type=int, default=PREFETCH_DEPTH, metavar="N",
+                    help="in a serial run, read the next N files on background threads while one is "
+                         "extracted; 0 reads them one at a time (default: %(default)s)")
+    ap.add_argument("--no-layout-cache", action="store_true",
+                    help="probe every label's result cells instead of reusing the offsets resolved "
+                         "on earlier sheets of the same report template")
+    ap.add_argument("--unit-cache-size", type=int, default=UNIT_CACHE_SIZE,
+                    help="entries in the value/unit parsing cache (default: %(default)s)")
+    ap.add_argument("--cache", metavar="FILE",
+                    help="SQLite extraction cache; unchanged files are not re-read")
+    add_instrumentation_args(ap)
+    args = ap.parse_args(argv)
+    if args.format == "parquet" and not parquet_available():
+        ap.error("--format parquet needs pyarrow (pip install pyarrow)")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_unit_cache(args.unit_cache_size)
+    LAYOUTS.enabled = not args.no_layout_cache
+
+    # files: strictly names that start with '0' (CSV or a columnar copy of it)
+    files = [p for p in list_normalized(args.input_dir) if os.path.basename(p).startswith("0")]
 
     if not files:
-        print(f"No files starting with '0' found in {INPUT_DIR}")
+        print(f"No files starting with '0' found in {args.input_dir}")
         return
 
     # load normalization log
-    if not os.path.exists(NORMAL_LOG):
-        print(f"Missing {NORMAL_LOG}. Please place it next to this script.")
+    if not os.path.exists(args.ledger):
+        print(f"Missing {args.ledger}. Please place it next to this script.")
         return
-    log = pd.read_csv(NORMAL_LOG, dtype=str)
-    # normalize column names
-    log.columns = [c.strip() for c in log.columns]
-    fn_col = next((c for c in log.columns if c.lower() in ("file name","file_name")), None)
-    new_col = next((c for c in log.columns if c.lower() in ("new name","new_name")), None)
-    if fn_col is None or new_col is None:
-        print("Normalization log must have 'File Name' and 'New Name' columns.")
+    try:
+        ledger_index = load_ledger_index(args.ledger)  # {file name: frozenset of New Names}
+    except ValueError as e:
+        print(e)
         return
 
-    # for each file, pull the set of expected test names
+    # for each file, pull the set of expected test names (exact file-name match)
     per_file_expected = {}
     for f in files:
         fn = os.path.basename(f)
-        mask = log[fn_col].astype(str).str.contains(fn, na=False)
-        per_file_expected[fn] = sorted(log.loc[mask, new_col].dropna().unique().tolist())
+        per_file_expected[fn] = sorted(ledger_index.get(fn, ()))
 
     # first pass: gather universe of biomarkers from expected names (canon)
     biomarker_canon = set()
@@ -280,43 +358,97 @@ def main():
 
     # build output columns: metadata + each biomarker value + units
     biomarker_list = sorted(biomarker_canon)
-    cols = ["file_name", "Name", "Age", "Gender"]
-    for b in biomarker_list:
+    meta_cols = ["file_name", "Name", "Age", "Gender"]
+    units_cols = [f"{b}_UNITS" for b in biomarker_list]
+    cols = list(meta_cols)
+    for b, u in zip(biomarker_list, units_cols):
         cols.append(b)
-        cols.append(f"{b}_UNITS")
+        cols.append(u)
+
+    # per-file (row, warnings) in file order, whether serial or from a process pool
+    expected = [per_file_expected.get(os.path.basename(f), []) for f in files]
+
+    # cached extractions are looked up here, before anything is handed to the workers;
+    # rows are still built from them in the normal flow so the schema can change freely
+    cache = ExtractionCache(args.cache, "dassanach", extractor_config()) if args.cache else None
+    if cache is not None:
+        keys = [cache.key(f, e) for f, e in zip(files, expected)]
+        cached = [cache.get(key) for key in keys]
+    else:
+        keys = cached = [None] * len(files)
+
+    report = TimingReport("Dassanach_000Files") if args.timings else None
+    if report is not None:
+        work = partial(run_timed, process_one_file, label_arg=0, cols=cols, biomarker_list=biomarker_list)
+    else:
+        work = partial(process_one_file, cols=cols, biomarker_list=biomarker_list)
+    if args.jobs > 1:
+        pool = ProcessPoolExecutor(max_workers=args.jobs)
+        results = pool.map(work, files, expected, cached, chunksize=max(1, len(files) // (args.jobs * 8)))
+    else:
+        pool = None
+        # serial: the next --prefetch files are read on threads while one is extracted
+        ahead = prefetched(lambda i: None if cached[i] is not None else read_sheet(files[i]),
+                           range(len(files)), args.prefetch)
+        results = (work(files[i], expected[i], cached[i], read=future.result) for i, future in ahead)
+    results = collect_timed(results, report)
+    out_timer = FileTimer(args.output) if report is not None else NULL_TIMER  # output writes
 
-    all_rows = []
     warns = []
-
-    for f in files:
-        fn = os.path.basename(f)
-        meta, found_raw = extract_from_one_file(f, per_file_expected.get(fn, []), warns)
-
-        row = {c: np.nan for c in cols}
-        row.update(meta)  # file_name, Name, Age, Gender
-
-        for b in biomarker_list:
-            v_raw = found_raw.get(b)
-            if v_raw is not None:
-                val, unit = split_value_and_unit(b, v_raw)
-                row[b] = val
-                row[f"{b}_UNITS"] = unit
+    try:
+        if args.stream:
+            # files are already in name order, so rows can go straight to disk
+            if args.format == "parquet":
+                writer = ChunkedParquetWriter(args.output, cols, units_cols, args.chunk_rows)
             else:
-                row[b] = np.nan
-                row[f"{b}_UNITS"] = "no_units"
-
-        all_rows.append(row)
-
-    out = pd.DataFrame(all_rows, columns=cols).sort_values("file_name")
-    out.to_csv(OUT_CSV, index=False)
-
-    with open(ERROR_LOG, "w") as fh:
+                writer = ChunkedCSVWriter(args.output, cols, args.chunk_rows)
+            with writer:
+                for key, hit, (row, file_warns, extracted) in zip(keys, cached, results):
+                    warns.extend(file_warns)
+                    with out_timer.phase("write"):
+                        writer.write_row(row)
+                    if cache is not None and hit is None:
+                        cache.put(key, extracted)
+            n_out, out_path = writer.rows_written, writer.path
+        else:
+            all_rows = []
+            for key, hit, (row, file_warns, extracted) in zip(keys, cached, results):
+                warns.extend(file_warns)
+                all_rows.append(row)
+                if cache is not None and hit is None:
+                    cache.put(key, extracted)
+
+            with out_timer.phase("write"):
+                out = pd.DataFrame(all_rows, columns=cols).sort_values("file_name")
+                del all_rows
+                # categorical units / float32 values / categorical metadata; the CSV text is unchanged
+                out = compact_frame(out, biomarker_list, units_cols, meta_cols[1:])
+                out_path = write_table(out, args.output, args.format)
+            n_out = len(out)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        if cache is not None:
+            cache.close()
+
+    with open(args.error_log, "w") as fh:
         for w in warns:
             fh.write(w + "\n")
 
-    print(f"✅ Wrote {OUT_CSV} with {len(out)} files.")
-    print(f"🧾 Error log: {ERROR_LOG} ({len(warns)} lines)")
+    print(f"✅ Wrote {out_path} with {n_out} files.")
+    print(f"🧾 Error log: {args.error_log} ({len(warns)} lines)")
+    if cache is not None:
+        print(cache.summary())
+    if report is not None:
+        report.add(out_timer.record())
+        report.write(args.timings)
+    if args.jobs <= 1:  # workers keep their own caches
+        info = unit_cache_info()
+        print(f"Unit cache: {info.hits} hits, {info.misses} misses, {info.currsize}/{info.maxsize} entries")
+        if LAYOUTS.enabled:
+            print(LAYOUTS.summary("labels"))
 
 if __name__ == "__main__":
-    main()
+    with profiled(parse_args().profile):
+        main()
 
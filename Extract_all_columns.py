@@ -1,95 +1,318 @@
-#!/usr/bin/env python3 
+#!/usr/bin/env python3
 import pandas as pd
 import os
 import re
+import argparse
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import repeat
+
+from normalized_io import COLUMNAR_FORMATS, OUTPUT_FORMATS, columnar_available, write_normalized
+from excel_readers import ENGINES, read_sheet
+from ingest_workbooks import duplicate_names, is_workbook
+from instrumentation import (NULL_TIMER, TimingReport, add_instrumentation_args, collect_timed,
+                             profiled, run_timed)
+
+EXCLUDED_NAMES = frozenset([
+    "Processed by :-",
+    "Name",
+    "MRN",
+    "Lab No",
+    "Referred By",
+    "Test Name",
+    "Report Printed On:",
+    "JANE MUMBI",
+    "VARIBIO LAB",
+    "VB",
+    "VB LAB",
+    "VB DOCTOR"
+])  # Names to exclude
+
+# One pass: each special character becomes "_", each run of whitespace becomes a single "_"
+NAME_PATTERN = re.compile(r"[^\w\s]|\s+")
+
+# bump when normalize_labels/normalized_label change what they write; with EXCLUDED_NAMES
+# and NAME_PATTERN it is stored in the manifest, and a manifest from other rules is not reused
+NORMALIZATION_RULES_VERSION = 1
+
+# Stripped cell text -> normalized label (None = leave the cell alone); labels repeat across files
+_label_cache = {}
+_MISSING = object()
 
 # Function to normalize names
 def normalize_name(name):
     """Normalize names by removing white space and replacing special characters with underscores."""
-    name = name.strip()  # Remove leading and trailing whitespace
-    name = re.sub(r"[^\w\s]", "_", name)  # Replace special characters with underscores
-    name = re.sub(r"\s+", "_", name)  # Replace spaces with underscores
-    return name
+    return NAME_PATTERN.sub("_", name.strip())
 
-# Function to process files, normalize entries, and save the output as CSV
-def normalize_files_and_save_with_log(folder_path, output_folder, log_csv):
-    excluded_names = [
-        "Processed by :-",
-        "Name",
-        "MRN",
-        "Lab No",
-        "Referred By",
-        "Test Name",
-        "Report Printed On:",
-        "JANE MUMBI",
-        "VARIBIO LAB",
-        "VB",
-        "VB LAB",
-        "VB DOCTOR"
-    ]  # List of names to exclude
+def normalized_label(value_stripped):
+    """Return the normalized label for a stripped cell, or None if the cell must be skipped."""
+    try:
+        return _label_cache[value_stripped]
+    except KeyError:
+        pass
+    # Skip if the name is in EXCLUDED_NAMES, contains numbers, asterisks, or is entirely numeric
+    if (
+        value_stripped in EXCLUDED_NAMES or
+        any(char.isdigit() for char in value_stripped) or  # Contains any digit
+        "*" in value_stripped or                          # Contains asterisks
+        value_stripped.isnumeric()                        # Is entirely numeric
+    ):
+        label = None
+    else:
+        label = normalize_name(value_stripped)
+    _label_cache[value_stripped] = label
+    return label
+
+def normalize_labels(df, file_name, log_rows):
+    """
+    Normalize string labels in the first four columns of df in place and append
+    ledger rows to log_rows, in the same order as a cell-by-cell walk (column, then row).
+    The cells are read once into an object array and each distinct label is
+    classified/normalized only once per process (see _label_cache).
+    """
+    block = df.iloc[:, :4].to_numpy(dtype=object)
+    hits = []
+    for col in range(4):  # First four columns
+        for index, value in enumerate(block[:, col]):
+            if isinstance(value, str):
+                value_stripped = value.strip()
+                normalized = _label_cache.get(value_stripped, _MISSING)
+                if normalized is _MISSING:
+                    normalized = normalized_label(value_stripped)
+                if normalized is None:
+                    continue  # Skip this entry
+
+                log_rows.append({
+                    "File Name": file_name,
+                    "Old Name": value_stripped,
+                    "New Name": normalized
+                })
+                hits.append((index, col, normalized))
+
+    for index, col, normalized in hits:
+        df.iat[index, col] = normalized  # Replace the value in the DataFrame
+
+# Function to normalize one workbook and save it as CSV; returns its ledger rows and output path
+def normalize_one_file(folder_path, file_name, output_folder, fmt="csv", engine="auto", timer=NULL_TIMER):
+    """
+    Normalize the first four columns of one workbook and save it as CSV (or fmt).
+    engine picks the workbook reader (see excel_readers.py); every engine yields the same frame.
+    Returns (log_rows, output_file_path); the path is None when the file failed.
+    """
+    file_path = os.path.join(folder_path, file_name)
+    print(f"Processing file: {file_name}")
+
+    # Ledger rows for this file only (merged by the caller)
+    log_rows = []
+
+    try:
+        # Read the file into a DataFrame
+        with timer.phase("read"):
+            df = read_sheet(file_path, engine)
+        timer.note(rows=df.shape[0], cols=df.shape[1])
+
+        # Normalize entries in the first four columns and collect log data
+        with timer.phase("scan"):
+            normalize_labels(df, file_name, log_rows)
+
+        # Save the modified DataFrame to a CSV (or columnar) file in the new folder
+        output_csv_name = os.path.splitext(file_name)[0] + ".csv"  # Change extension to .csv
+        with timer.phase("write"):
+            output_file_path = write_normalized(df, os.path.join(output_folder, output_csv_name), fmt)
+        print(f"File saved to: {output_file_path}")
+
+    except Exception as e:
+        print(f"Error processing file {file_name}: {e}")
+        return log_rows, None
+
+    return log_rows, output_file_path
+
+# ------------- manifest helpers (incremental re-normalization) -------------
+def file_sha256(path, chunk_size=1 << 20):
+    """Hash a file's content in fixed-size chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
 
+def normalization_rules():
+    """sha256 of everything that decides a normalized sheet besides the workbook itself."""
+    rules = (NORMALIZATION_RULES_VERSION, sorted(EXCLUDED_NAMES), NAME_PATTERN.pattern)
+    return hashlib.sha256(repr(rules).encode("utf-8")).hexdigest()
+
+def load_manifest(manifest_path):
+    """Return {file_name: entry} from a previous run with the same rules, or {} if there is none."""
+    if not manifest_path or not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path) as fh:
+            manifest = json.load(fh)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable manifest {manifest_path}: {e}")
+        return {}
+    if manifest.get("rules") != normalization_rules():
+        print(f"Ignoring manifest {manifest_path}: written under other normalization rules")
+        return {}
+    return manifest.get("files", {})
+
+def save_manifest(manifest_path, entries):
+    """Write the manifest atomically so an interrupted run never leaves it half-written."""
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as fh:
+        json.dump({"rules": normalization_rules(), "files": entries}, fh, indent=1)
+    os.replace(tmp_path, manifest_path)
+
+def output_path(output_folder, file_name, fmt="csv"):
+    """The path normalize_one_file writes file_name's sheet to."""
+    stem = os.path.join(output_folder, os.path.splitext(file_name)[0])
+    return stem + (".csv" if fmt == "csv" else COLUMNAR_FORMATS[fmt])
+
+def is_unchanged(entry, file_path, stat, output):
+    """
+    Whether entry's output is this run's output (same folder and format) and still exists;
+    then a cheap check (size + mtime), falling back to the content hash so a
+    touched-but-identical workbook is still skipped. Returns (unchanged, sha256).
+    """
+    if entry is None or os.path.normpath(entry.get("output") or "") != os.path.normpath(output):
+        return False, None  # not normalized yet, or written to another folder / format
+    if not os.path.exists(output):
+        return False, None
+    if entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+        return True, entry["sha256"]
+    sha = file_sha256(file_path)
+    return sha == entry.get("sha256"), sha
+
+# Function to process files, normalize entries, and save the output as CSV
+def normalize_files_and_save_with_log(folder_path, output_folder, log_csv, workers=1, manifest_path=None, fmt="csv",
+                                      timings_path=None, engine="auto"):
+    """
+    Normalize every .xls/.xlsx in folder_path and write the combined ledger to log_csv.
+    With workers > 1 the workbooks are parsed in a process pool; ledger rows are merged
+    back in directory-listing order so the log matches a serial run byte for byte.
+    With a manifest_path, workbooks whose content is unchanged since the last run are
+    skipped and their ledger rows are reused from the manifest. Workbooks the ingest map
+    (ingest_workbooks.py) lists as duplicates of another one are left out while neither
+    has changed since the map was written; each one left out is printed.
+    fmt selects the per-file output: "csv" (headerless) or a columnar "feather"/"parquet".
+    timings_path writes per-file read/scan/write seconds (see instrumentation.py).
+    engine selects the workbook reader; "auto" uses the fastest installed one (excel_readers.py).
+    """
     # Ensure the output folder exists
     os.makedirs(output_folder, exist_ok=True)
 
-    # List to store log data
-    log_data = []
+    # same test as ingest_workbooks.py: .xls/.xlsx in any case, Excel lock files skipped
+    file_names = [file_name for file_name in os.listdir(folder_path) if is_workbook(file_name)]
+    # workbooks ingest_workbooks.py found to repeat another one's content are not parsed again
+    duplicates = duplicate_names(folder_path)
+    for file_name in file_names:
+        if file_name in duplicates:
+            print(f"Skipping {file_name}: same content as {duplicates[file_name]} (ingest map)")
+    file_names = [f for f in file_names if f not in duplicates]
+
+    # Split the listing into workbooks we can reuse and workbooks we must parse
+    manifest = load_manifest(manifest_path)
+    new_manifest = {}
+    stats, hashes, to_process = {}, {}, []
+    for file_name in file_names:
+        file_path = os.path.join(folder_path, file_name)
+        stats[file_name] = os.stat(file_path)
+        if manifest_path:
+            unchanged, sha = is_unchanged(manifest.get(file_name), file_path, stats[file_name],
+                                          output_path(output_folder, file_name, fmt))
+            if unchanged:
+                new_manifest[file_name] = dict(manifest[file_name], mtime_ns=stats[file_name].st_mtime_ns)
+                continue
+            hashes[file_name] = sha or file_sha256(file_path)
+        to_process.append(file_name)
 
-    for file_name in os.listdir(folder_path):
-        if file_name.endswith(".xls") or file_name.endswith(".xlsx"):
-            file_path = os.path.join(folder_path, file_name)
-            print(f"Processing file: {file_name}")
-
-            try:
-                # Read the file into a DataFrame
-                if file_name.endswith(".xls"):
-                    df = pd.read_excel(file_path, header=None, engine='xlrd')
-                else:
-                    df = pd.read_excel(file_path, header=None)
-
-                # Normalize entries in the first three columns and collect log data
-                # Normalize entries in the first four columns and collect log data
-                for col in range(4):  # First four columns
-                    for index, value in df.iloc[:, col].dropna().items():
-                        if isinstance(value, str):
-                            value_stripped = value.strip()
-            
-                            # Skip if the name is in excluded_names, contains numbers, asterisks, or is entirely numeric
-                            if (
-                                value_stripped in excluded_names or
-                                any(char.isdigit() for char in value_stripped) or  # Contains any digit
-                                "*" in value_stripped or                          # Contains asterisks
-                                value_stripped.isnumeric()                        # Is entirely numeric
-                            ):
-                                continue  # Skip this entry
-
-                            # Normalize and log valid names
-                            normalized = normalize_name(value_stripped)
-                            log_data.append({
-                                "File Name": file_name,
-                                "Old Name": value_stripped,
-                                "New Name": normalized
-                            })
-                            df.iat[index, col] = normalized  # Replace the value in the DataFrame
-
-                # Save the modified DataFrame to a CSV file in the new folder
-                output_csv_name = os.path.splitext(file_name)[0] + ".csv"  # Change extension to .csv
-                output_file_path = os.path.join(output_folder, output_csv_name)
-                df.to_csv(output_file_path, index=False, header=False)
-                print(f"File saved to: {output_file_path}")
-
-            except Exception as e:
-                print(f"Error processing file {file_name}: {e}")
+    if manifest_path:
+        print(f"{len(file_names) - len(to_process)} unchanged, {len(to_process)} to normalize")
+
+    report = TimingReport("Extract_all_columns") if timings_path else None
+    task = partial(run_timed, normalize_one_file, label_arg=1) if report else normalize_one_file
+    if workers > 1 and len(to_process) > 1:
+        # pool.map yields results in submission order, whatever order workers finish in
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(collect_timed(pool.map(
+                task, repeat(folder_path), to_process, repeat(output_folder), repeat(fmt), repeat(engine)
+            ), report))
+    else:
+        results = list(collect_timed((task(folder_path, f, output_folder, fmt, engine) for f in to_process), report))
+    fresh = dict(zip(to_process, results))
+
+    # Record successfully normalized files; failures are retried on the next run
+    for file_name, (rows, output_file_path) in fresh.items():
+        if manifest_path and output_file_path is not None:
+            new_manifest[file_name] = {
+                "sha256": hashes[file_name],
+                "size": stats[file_name].st_size,
+                "mtime_ns": stats[file_name].st_mtime_ns,
+                "output": output_file_path,
+                "format": fmt,
+                "log_rows": rows,
+            }
+
+    # List to store log data, merged in listing order
+    log_data = []
+    for file_name in file_names:
+        if file_name in fresh:
+            log_data.extend(fresh[file_name][0])
+        else:
+            log_data.extend(new_manifest[file_name]["log_rows"])
 
     # Save the log data to a CSV file
     log_df = pd.DataFrame(log_data)
     log_df.to_csv(log_csv, index=False)
     print(f"Log successfully saved to {log_csv}")
 
-# Specify folder paths
-input_folder = "./xls"  # Replace with the path to your original folder
-output_folder = "./normalized_files"  # Replace with the path to your output folder
-log_csv = "normalization_log.csv"  # Output CSV for old and new names
+    if manifest_path:
+        save_manifest(manifest_path, new_manifest)
+        print(f"Manifest saved to {manifest_path}")
+
+    if report is not None:
+        report.write(timings_path)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Normalize test labels in lab workbooks and write a name ledger.")
+    parser.add_argument("--input-dir", default="./xls",
+                        help="folder with the lab workbooks (default: %(default)s)")
+    parser.add_argument("--output-dir", default="./normalized_files",
+                        help="folder for the normalized per-file sheets (default: %(default)s)")
+    parser.add_argument("--log", default="normalization_log.csv",
+                        help="ledger of old -> new label names (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes used to parse workbooks (default: 1, serial)")
+    parser.add_argument("--manifest", default="normalization_manifest.json",
+                        help="manifest of already-normalized workbooks (default: %(default)s)")
+    parser.add_argument("--full", action="store_true",
+                        help="ignore the manifest and re-normalize every workbook")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="csv",
+                        help="per-file output format; feather/parquet store every cell as text (default: csv)")
+    parser.add_argument("--engine", choices=ENGINES, default="auto",
+                        help="workbook reader; auto tries calamine, then a streaming .xlsx reader, "
+                             "then pandas' default (default: %(default)s)")
+    add_instrumentation_args(parser)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.format != "csv" and not columnar_available():
+        raise SystemExit(f"--format {args.format} needs pyarrow (pip install pyarrow)")
+
+    # Specify folder paths
+    input_folder = args.input_dir  # original workbooks
+    output_folder = args.output_dir  # normalized per-file sheets
+    log_csv = args.log  # Output CSV for old and new names
 
-# Run the normalization function
-normalize_files_and_save_with_log(input_folder, output_folder, log_csv)
+    # --full still rewrites the manifest, it just doesn't trust the old one
+    if args.full and os.path.exists(args.manifest):
+        os.remove(args.manifest)
 
+    # Run the normalization function
+    with profiled(args.profile):
+        normalize_files_and_save_with_log(input_folder, output_folder, log_csv,
+                                          workers=args.workers, manifest_path=args.manifest, fmt=args.format,
+                                          timings_path=args.timings, engine=args.engine)
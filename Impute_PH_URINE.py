@@ -1,14 +1,135 @@
 #!/usr/bin/env python3
 import pandas as pd
 import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import repeat
 from difflib import SequenceMatcher
+from normalized_io import read_normalized, resolve_normalized
+from extraction_cache import ExtractionCache
+from instrumentation import (NULL_TIMER, FileTimer, TimingReport, add_instrumentation_args, collect_timed,
+                             profiled, run_timed)
+
+PH_LABEL = "PH___URINE__Urine_"
+GGT_LABEL = "GAMMA_GT__GGT_"
 
 # Function to check for a 75% match
 def is_similar(a, b, threshold=0.85):
     return SequenceMatcher(None, a, b).ratio() >= threshold
 
+class LabelMatcher:
+    """
+    is_similar(label, target, threshold) for one fixed target, with cheap gates in front
+    of the full SequenceMatcher.ratio() and a memo of decisions shared across files.
+    Both gates are upper bounds on ratio(), so the threshold semantics are unchanged.
+    """
+    def __init__(self, target, threshold=0.85):
+        self.target = target
+        self.threshold = threshold
+        self._matcher = SequenceMatcher(None)
+        self._matcher.set_seq2(target)  # target analysis is done once
+        self._cache = {}
+
+    def __call__(self, label):
+        try:
+            return self._cache[label]
+        except KeyError:
+            pass
+        # length bound: ratio() can never exceed 2 * min(len) / total len
+        total = len(label) + len(self.target)
+        if 2.0 * min(len(label), len(self.target)) / total < self.threshold:
+            result = False
+        else:
+            self._matcher.set_seq1(label)
+            result = (self._matcher.quick_ratio() >= self.threshold
+                      and self._matcher.ratio() >= self.threshold)
+        self._cache[label] = result
+        return result
+
+# Label decisions repeat across thousands of files, so one matcher is shared
+PH_MATCHER = LabelMatcher(PH_LABEL)
+
+def cell_text(value):
+    return str(value).strip() if pd.notna(value) else ""
+
+def build_label_index(values, n_cols=4):
+    """{stripped cell text: [(row, col), ...]} for the first n_cols columns, in row-major order."""
+    index = {}
+    for row_index, row in enumerate(values[:, :n_cols]):
+        for col_index, value in enumerate(row):
+            index.setdefault(cell_text(value), []).append((row_index, col_index))
+    return index
+
+def find_ph(values, index, matcher=PH_MATCHER):
+    """
+    First pH-like label (row-major) followed by a usable value: any non-empty cell in the
+    same row other than the label itself, else any non-empty cell in the next row.
+    """
+    hits = sorted(pos for label, positions in index.items() if label and matcher(label) for pos in positions)
+    for row_index, col_index in hits:
+        cell_value = cell_text(values[row_index, col_index])
+        # Once found, search the entire row for any non-empty entry other than the target
+        for value in map(cell_text, values[row_index]):
+            if value and value != cell_value:  # Ensure it's not the target term
+                return value
+        # If no value found in the same row, check the next row
+        if row_index + 1 < len(values):
+            for value in map(cell_text, values[row_index + 1]):
+                if value:  # Any non-empty value
+                    return value
+    return "NA"
+
+def find_ggt(values, index):
+    """Exact GGT label in the first three columns; the result sits 4 columns over."""
+    for row_index, col_index in index.get(GGT_LABEL, []):
+        result_col = col_index + 4  # Assuming result is 3 columns over
+        if col_index < 3 and result_col < values.shape[1]:  # Ensure the result column exists
+            result = values[row_index, result_col]
+            return str(result).strip() if pd.notna(result) else "NA"
+    return "NA"
+
+# Function to pull (pH, GGT) out of one normalized file; runs in worker processes
+def extract_ph_and_gamma(normalized_folder, file_name, timer=NULL_TIMER):
+    """
+    Returns (ph, ggt) for one file, ("NA", "NA") if the file does not exist,
+    or (None, None) if it could not be processed (META keeps its current values).
+    """
+    file_path = os.path.join(normalized_folder, file_name)
+
+    if resolve_normalized(file_path) is None:
+        print(f"File {file_name} not found in {normalized_folder}.")
+        return "NA", "NA"
+
+    try:
+        # Load the corresponding normalized file (columnar copy or CSV)
+        with timer.phase("read"):
+            df = read_normalized(file_path)
+        timer.note(rows=df.shape[0], cols=df.shape[1])
+
+        with timer.phase("scan"):
+            values = df.to_numpy(dtype=object)
+            index = build_label_index(values)  # one pass over the label columns
+
+        # Logic for "PH___URINE__Urine_" (fuzzy) and "GAMMA_GT__GGT_" (exact);
+        # "NA" if no entry is found
+        with timer.phase("extract"):
+            return find_ph(values, index), find_ggt(values, index)
+
+    except Exception as e:
+        print(f"Error processing file {file_name}: {e}")
+        return None, None
+
 # Function to process files and update the META.csv
-def update_meta_with_ph_and_gamma(meta_file, normalized_folder, output_file):
+def update_meta_with_ph_and_gamma(meta_file, normalized_folder, output_file, workers=1, cache_path=None,
+                                  timings_path=None):
+    """
+    Fill urine pH and GGT for every META row from its normalized file.
+    Each distinct file is read once (in a process pool when workers > 1) and the
+    per-file results are joined back onto META by file_name. With cache_path, files
+    unchanged since an earlier run take their (pH, GGT) from that cache.
+    timings_path writes per-file read/scan/extract seconds (see instrumentation.py).
+    """
     # Load the META.csv
     meta_df = pd.read_csv(meta_file)
 
@@ -18,84 +139,77 @@ def update_meta_with_ph_and_gamma(meta_file, normalized_folder, output_file):
     if "GAMMA_GT__GGT_" not in meta_df.columns:
         meta_df["GAMMA_GT__GGT_"] = None
 
-    # Iterate through each file name in the "file_name" column of META.csv
-    for _, row in meta_df.iterrows():
-        file_name = row["file_name"]
-        file_path = os.path.join(normalized_folder, file_name)
-
-        if os.path.exists(file_path):
-            try:
-                # Load the corresponding normalized file
-                df = pd.read_csv(file_path, header=None)
-
-                # Logic for "PH___URINE__Urine_"
-                found_ph = False
-                for row_index in range(len(df)):
-                    for col_index in range(4):  # First four columns
-                        cell_value = str(df.iat[row_index, col_index]).strip() if pd.notna(df.iat[row_index, col_index]) else ""
-
-                        if is_similar(cell_value, "PH___URINE__Urine_"):
-                            # Once found, search the entire row for any non-empty entry other than the target
-                            for col_check in range(len(df.columns)):
-                                value = str(df.iat[row_index, col_check]).strip() if pd.notna(df.iat[row_index, col_check]) else ""
-                                if value and value != cell_value:  # Ensure it's not the target term
-                                    meta_df.at[_, "ph___urine__urine_"] = value
-                                    found_ph = True
-                                    break
-
-                            # If no value found in the same row, check the next row
-                            if not found_ph and row_index + 1 < len(df):
-                                for col_check in range(len(df.columns)):
-                                    value = str(df.iat[row_index + 1, col_check]).strip() if pd.notna(df.iat[row_index + 1, col_check]) else ""
-                                    if value:  # Any non-empty value
-                                        meta_df.at[_, "ph___urine__urine_"] = value
-                                        found_ph = True
-                                        break
-
-                            if found_ph:
-                                break
-                    if found_ph:
-                        break
-
-                # If no entry is found, leave as NA
-                if not found_ph:
-                    meta_df.at[_, "ph___urine__urine_"] = "NA"
-
-                # Logic for "GAMMA_GT__GGT_"
-                found_gamma = False
-                for row_index in range(len(df)):
-                    for col_index in range(3):  # Search in the first three columns
-                        cell_value = str(df.iat[row_index, col_index]).strip() if pd.notna(df.iat[row_index, col_index]) else ""
-
-                        if cell_value == "GAMMA_GT__GGT_":
-                            result_col = col_index + 4  # Assuming result is 3 columns over
-                            if result_col < df.shape[1]:  # Ensure the result column exists
-                                result = str(df.iat[row_index, result_col]).strip() if pd.notna(df.iat[row_index, result_col]) else "NA"
-                                meta_df.at[_, "GAMMA_GT__GGT_"] = result
-                                found_gamma = True
-                            break
-                    if found_gamma:
-                        break
-
-                # If no entry is found, leave as NA
-                if not found_gamma:
-                    meta_df.at[_, "GAMMA_GT__GGT_"] = "NA"
-
-            except Exception as e:
-                print(f"Error processing file {file_name}: {e}")
-        else:
-            print(f"File {file_name} not found in {normalized_folder}.")
-            meta_df.at[_, "ph___urine__urine_"] = "NA"
-            meta_df.at[_, "GAMMA_GT__GGT_"] = "NA"
+    # Each distinct file name in the "file_name" column of META.csv, in first-seen order
+    file_names = meta_df["file_name"].dropna().drop_duplicates().tolist()
+
+    # Cached files are resolved here; only the rest are read (and only they go to the pool)
+    results = [None] * len(file_names)
+    cache = None
+    if cache_path:
+        cache = ExtractionCache(cache_path, "impute_ph_ggt", (PH_LABEL, GGT_LABEL, PH_MATCHER.threshold))
+        keys = [cache.key(os.path.join(normalized_folder, f)) for f in file_names]
+        results = [cache.get(key) for key in keys]
+    todo = [i for i, result in enumerate(results) if result is None]
+    todo_names = [file_names[i] for i in todo]
+
+    report = TimingReport("Impute_PH_URINE") if timings_path else None
+    task = partial(run_timed, extract_ph_and_gamma, label_arg=1) if report else extract_ph_and_gamma
+    if workers > 1 and len(todo_names) > 1:
+        chunksize = max(1, len(todo_names) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            extracted = list(collect_timed(pool.map(task, repeat(normalized_folder), todo_names,
+                                                    chunksize=chunksize), report))
+    else:
+        extracted = list(collect_timed((task(normalized_folder, f) for f in todo_names), report))
+
+    for i, result in zip(todo, extracted):
+        results[i] = result
+        if cache is not None and result != (None, None):  # failures are retried next run
+            cache.put(keys[i], result)
+    if cache is not None:
+        cache.close()
+        print(cache.summary())
+
+    # Join the per-file results back onto META; failed files keep their current values
+    per_file = pd.DataFrame(results, index=file_names, columns=["ph___urine__urine_", "GAMMA_GT__GGT_"])
+    for column in per_file.columns:
+        looked_up = meta_df["file_name"].map(per_file[column])
+        meta_df[column] = looked_up.where(looked_up.notna(), meta_df[column].astype(object))
 
     # Save the updated META.csv with a new name
-    meta_df.to_csv(output_file, index=False)
+    timer = FileTimer(output_file) if report is not None else NULL_TIMER
+    with timer.phase("write"):
+        meta_df.to_csv(output_file, index=False)
     print(f"Updated META.csv saved to {output_file}")
 
-# Paths and file names
-meta_file = "COLOMBIA_WITH_META.csv"  # Input META.csv file
-normalized_folder = "normalized_files"  # Folder containing the .csv files to search
-output_file = "META_updated_FINAL_COLOMBIA.csv"  # Output file name for the updated META.csv
-
-# Run the function
-update_meta_with_ph_and_gamma(meta_file, normalized_folder, output_file)
+    if report is not None:
+        report.add(timer.record())
+        report.write(timings_path)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fill urine pH and GGT in META from the normalized files.")
+    parser.add_argument("--meta", default="COLOMBIA_WITH_META.csv",
+                        help="META table to fill (default: %(default)s)")
+    parser.add_argument("--normalized-dir", default="normalized_files",
+                        help="folder with the normalized files (default: %(default)s)")
+    parser.add_argument("--output", default="META_updated_FINAL_COLOMBIA.csv",
+                        help="updated META table (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes reading normalized files (default: 1, serial)")
+    parser.add_argument("--cache", metavar="FILE",
+                        help="SQLite extraction cache; unchanged files are not re-read")
+    add_instrumentation_args(parser)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    # Paths and file names
+    meta_file = args.meta  # Input META.csv file
+    normalized_folder = args.normalized_dir  # Folder containing the .csv files to search
+    output_file = args.output  # Output file name for the updated META.csv
+
+    # Run the function
+    with profiled(args.profile):
+        update_meta_with_ph_and_gamma(meta_file, normalized_folder, output_file, workers=args.workers,
+                                      cache_path=args.cache, timings_path=args.timings)
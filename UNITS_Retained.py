@@ -1,10 +1,10 @@
 #!/usr/bin/env python3
-import re
-import pandas as pd
+import argparse
 import numpy as np
-
-#load data Generated by Previous Impute_PH_URINE.py script 
-df = pd.read_csv("META_updated_FINAL_COLOMBIA.csv")
+import pandas as pd
+from unit_parsing import split_values_and_units
+from compact_frames import (TABLE_FORMATS, ParquetAppender, compact_metadata, compact_units, compact_values,
+                            parquet_available, share_unit_categories, table_path, write_table)
 
 # Flag metadata so that everything else treated as biomarker
 METADATA_COLS = [
@@ -12,170 +12,152 @@ METADATA_COLS = [
     "name","received_on","referred_by","reported_on","merge_key","Sex","Age","Sampling.location"
 ]
 
-# If some of these aren’t present, that’s fine.
-present_meta = [c for c in METADATA_COLS if c in df.columns]
-biomarker_cols = [c for c in df.columns if c not in present_meta]
-
-# helpers to seperate the values and units surgically .Dr Muhoya style
-
-num_regex = re.compile(r"""
-    ^\s*                # leading spaces
-    (?P<num>[+-]?\d{1,3}(?:,\d{3})*|\d+)   # int with optional thousands
-    (?:\.\d+)?          # optional decimals
-    (?:[eE][+-]?\d+)?   # optional scientific notation
-""", re.VERBOSE)
-
-def clean_numeric(s):
-    """Extract leading numeric, return float or NaN."""
-    if pd.isna(s):
-        return np.nan
-    s = str(s).strip()
-    m = num_regex.match(s)
-    if not m:
-        # handle ratio like "1.97 :1"
-        ratio_match = re.match(r"^\s*([+-]?\d+(?:\.\d+)?)\s*:?\s*1\s*$", s)
-        if ratio_match:
-            return float(ratio_match.group(1))
-        # pH like "5" or "5.6" already matched above; purely qualitative -> NaN
-        return np.nan
-    num = m.group(0)
-    num = num.replace(",", "")
-    try:
-        return float(num)
-    except:
-        return np.nan
-
-# canonical unit mapping (add as needed)
-UNIT_MAP = {
-    # molarity
-    "mmol/l": "mmol/L",
-    "μmol/l": "umol/L",
-    "umol/l": "umol/L",
-    # activity
-    "iu/l": "IU/L",
-    # mass concentration
-    "mg/dl": "mg/dL",
-    "g/dl":  "g/dL",
-    "g/l":   "g/L",
-    # osmolality
-    "mosmol/kg": "mOsmol/kg",
-    "mosm/kg":   "mOsmol/kg",
-    "mosmolkg":  "mOsmol/kg",
-}
-
-def normalize_unit(raw_unit, col_name, raw_value_str):
-    """Standardize unit text; handle special cases."""
-    if raw_unit is None:
-        raw_unit = ""
-    unit = str(raw_unit)
-
-    # grab substring after the numeric prefix
-    if isinstance(raw_value_str, str):
-        m = num_regex.match(raw_value_str.strip())
-        if m:
-            unit = raw_value_str[m.end():]
+def meta_columns(columns):
+    """The METADATA_COLS present, in table order; everything else is a biomarker."""
+    return [c for c in columns if c in METADATA_COLS]
+
+def split_biomarkers(df, stable_schema=False):
+    """
+    Every biomarker column split into value + <col>_UNITS; returns (df, units columns added).
+    Columns come back compact (see compact_frames.py). With stable_schema only the units
+    become categorical, so every chunk of a chunked Parquet write has the same column types.
+    """
+    # If some of these aren’t present, that’s fine.
+    present_meta = meta_columns(df.columns)
+    biomarker_cols = [c for c in df.columns if c not in present_meta]
+
+    # Lets use the functions now on the biomarker columns: compute every value/units pair first
+    split_cols = {}
+    for col in biomarker_cols:
+        values, units = split_values_and_units(df[col], col)  # numeric only, units
+        split_cols[col] = (values if stable_schema else compact_values(values), compact_units(units))
+    units_cols_added = [f"{col}_UNITS" for col in biomarker_cols]
+
+    # then assemble the frame once, each units column right next to its value column
+    assembled = {}
+    for col in df.columns:
+        if col in split_cols:
+            assembled[col], assembled[f"{col}_UNITS"] = split_cols[col]
         else:
-            # no number present -> qualitative?
-            unit = raw_value_str
-
-    # tidy punctuation/casing/spaces
-    unit = unit.strip()
-    unit = unit.replace(".", " ").replace("·", " ")
-    unit = re.sub(r"\s+", " ", unit)
-    unit = unit.replace(" /", "/").replace("/ ", "/")
-    unit = unit.replace(" l", "/L").replace(" L", "/L")  # mild rescue
-    unit = unit.lower()
-    unit = unit.replace("µ", "u")  # normalize micro symbol
-    unit = unit.replace("umol/ l", "umol/l")  # common spacing glitch
-
-    # special cases by column
-    if col_name.lower().startswith("ph"):
-        return "unitless"
-    if "ratio" in col_name.lower() or re.search(r"\d\s*:\s*1$", str(raw_value_str)):
-        return "ratio"
-    if unit in ("", " ", None):
-        return "no_units"
-
-    # strip leading junk like ":" or residual spaces
-    unit = unit.strip(" :;")
-
-    # collapse weird 'mg dL', 'mg  dL' forms -> mg/dL
-    unit = unit.replace("mg dl", "mg/dl").replace("g dl", "g/dl")
-
-    # map to canonical
-    canon = UNIT_MAP.get(unit)
-    if canon:
-        return canon
-
-    # heuristic rescues
-    if "umol" in unit:
-        return "umol/L"
-    if "mmol" in unit:
-        return "mmol/L"
-    if "iu" in unit:
-        return "IU/L"
-    if "mg" in unit and "dl" in unit:
-        return "mg/dL"
-    if "g" in unit and "/l" in unit:
-        return "g/L"
-    if "osmol" in unit:
-        return "mOsmol/kg"
-
-    # qualitative?
-    if re.fullmatch(r"(negative|pos|positive|trace|tr|nil|none)", unit.strip(), flags=re.I):
-        return "qual"
-
-    return unit  # leave as-is so we can audit later
-
-def split_value_and_unit(s, col_name):
-    """Return numeric_value, unit_label according to rules."""
-    if pd.isna(s):
-        return np.nan, "no_units"
-    s = str(s).strip()
-    val = clean_numeric(s)
-
-    # classify unit
-    unit = normalize_unit(None, col_name, s)
-
-    # qualitative only (no number)
-    if pd.isna(val):
-        # If it looks like pH written as plain number-less? Rare; keep as qualitative.
-        if unit == "unitless":
-            return np.nan, "unitless"
-        # e.g., "Negative"
-        return np.nan, "qual" if unit not in ("no_units",) else "no_units"
-
-    # have a numeric value
-    if unit in ("", "no_units"):
-        unit = "no_units"
-
-    return val, unit
-
-# Lets use the functions now on the biomarker columns
-units_cols_added = []
-for col in biomarker_cols:
-    val_unit = df[col].apply(lambda x: split_value_and_unit(x, col))
-    df[col] = val_unit.apply(lambda t: t[0])  # numeric only
-    units_col = f"{col}_UNITS"
-    df[units_col] = val_unit.apply(lambda t: t[1])
-    units_cols_added.append(units_col)
-
-    # move the units column right next to its value column
-    cols = list(df.columns)
-    cols.remove(units_col)
-    insert_at = cols.index(col) + 1
-    cols.insert(insert_at, units_col)
-    df = df.reindex(columns=cols)
-
-# --- 4) quick QC summary
-summary = (
-    pd.Series({c: (df[c] == "no_units").sum() for c in units_cols_added}, name="no_units_count")
-    .to_frame()
-)
-summary["qual_count"] = pd.Series({c: (df[c] == "qual").sum() for c in units_cols_added})
-summary["unique_units_seen"] = pd.Series({c: df[c].nunique() for c in units_cols_added})
-print(summary.sort_values("no_units_count", ascending=False).head(15))
-
-# --- 5) (optional) save
-df.to_csv("META_updated_FINAL_COLOMBIA_UNITS_DIVIDED.csv", index=False)
-
+            assembled[col] = df[col] if stable_schema else compact_metadata(df[col])
+    df = share_unit_categories(pd.concat(assembled, axis=1), units_cols_added)
+    return df, units_cols_added
+
+def qc_summary(df, units_cols_added):
+    summary = (
+        pd.Series({c: (df[c] == "no_units").sum() for c in units_cols_added}, name="no_units_count")
+        .to_frame()
+    )
+    summary["qual_count"] = pd.Series({c: (df[c] == "qual").sum() for c in units_cols_added})
+    summary["unique_units_seen"] = pd.Series({c: df[c].nunique() for c in units_cols_added})
+    return summary
+
+class RunningQC:
+    """qc_summary() counts accumulated chunk by chunk, for tables read with --chunksize."""
+    def __init__(self):
+        self.units_cols = []
+        self.no_units = {}
+        self.qual = {}
+        self.seen = {}
+
+    def add(self, df, units_cols_added):
+        if not self.units_cols:
+            self.units_cols = list(units_cols_added)
+        for c in units_cols_added:
+            self.no_units[c] = self.no_units.get(c, 0) + int((df[c] == "no_units").sum())
+            self.qual[c] = self.qual.get(c, 0) + int((df[c] == "qual").sum())
+            self.seen.setdefault(c, set()).update(df[c].dropna().unique())
+
+    def summary(self):
+        summary = pd.Series({c: self.no_units[c] for c in self.units_cols}, name="no_units_count").to_frame()
+        summary["qual_count"] = pd.Series({c: self.qual[c] for c in self.units_cols})
+        summary["unique_units_seen"] = pd.Series({c: len(self.seen[c]) for c in self.units_cols})
+        return summary
+
+def common_dtype(a, b):
+    """The dtype read_csv settles on when two parts of one column were inferred as a and b."""
+    if a == b:
+        return a
+    if {a.kind, b.kind} <= {"i", "u", "f"}:
+        return np.dtype("float64")
+    return np.dtype(object)
+
+def meta_dtypes(path, chunksize):
+    """
+    Dtypes of the metadata columns over the whole file, read a chunk at a time. Fixing
+    them for every chunk keeps e.g. an MRN column with a gap further down written as
+    123.0 throughout, as a whole-file read would, rather than 123 in some chunks.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    present_meta = meta_columns(header)
+    dtypes = {}
+    if not present_meta:
+        return dtypes
+    for chunk in pd.read_csv(path, usecols=present_meta, chunksize=chunksize):
+        for col, dtype in chunk.dtypes.items():
+            dtypes[col] = dtype if col not in dtypes else common_dtype(dtypes[col], dtype)
+    return dtypes
+
+def split_in_chunks(input_csv, output, chunksize, fmt="csv"):
+    """
+    Out-of-core split: read input_csv chunksize rows at a time, split each chunk and
+    append it to output (CSV, or one Parquet row group per chunk). Returns the QC
+    summary of the whole table; only one chunk and the running counts are held in memory.
+    """
+    dtypes = meta_dtypes(input_csv, chunksize)
+    qc = RunningQC()
+    rows = 0
+    parquet = ParquetAppender(table_path(output, fmt)) if fmt == "parquet" else None
+    try:
+        for i, chunk in enumerate(pd.read_csv(input_csv, chunksize=chunksize, dtype=dtypes)):
+            chunk, units_cols_added = split_biomarkers(chunk, stable_schema=parquet is not None)
+            qc.add(chunk, units_cols_added)
+            if parquet is not None:
+                parquet.write(chunk)
+            else:
+                chunk.to_csv(output, mode="w" if i == 0 else "a", header=i == 0, index=False)
+            rows += len(chunk)
+    finally:
+        if parquet is not None:
+            parquet.close()
+    print(f"{rows} rows written to {parquet.path if parquet is not None else output}")
+    return qc.summary()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Split biomarker results into numeric value and units columns.")
+    parser.add_argument("--input", default="META_updated_FINAL_COLOMBIA.csv",
+                        help="META table from Impute_PH_URINE.py (default: %(default)s)")
+    parser.add_argument("--output", default="META_updated_FINAL_COLOMBIA_UNITS_DIVIDED.csv",
+                        help="table with the _UNITS columns added (default: %(default)s)")
+    parser.add_argument("--chunksize", type=int, metavar="ROWS",
+                        help="read and split the table ROWS rows at a time, appending to the output, "
+                             "for tables that don't fit in memory (default: whole table at once)")
+    parser.add_argument("--format", choices=list(TABLE_FORMATS), default="csv",
+                        help="output format; parquet keeps the compact dtypes and replaces the "
+                             "output's suffix with .parquet (default: %(default)s)")
+    args = parser.parse_args(argv)
+    if args.format == "parquet" and not parquet_available():
+        parser.error("--format parquet needs pyarrow (pip install pyarrow)")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.chunksize:
+        summary = split_in_chunks(args.input, args.output, args.chunksize, args.format)
+        print(summary.sort_values("no_units_count", ascending=False).head(15))
+        return
+
+    #load data Generated by Previous Impute_PH_URINE.py script
+    df = pd.read_csv(args.input)
+    df, units_cols_added = split_biomarkers(df)
+
+    # --- 4) quick QC summary
+    summary = qc_summary(df, units_cols_added)
+    print(summary.sort_values("no_units_count", ascending=False).head(15))
+
+    # --- 5) (optional) save
+    path = write_table(df, args.output, args.format)
+    print(f"Saved {path}")
+
+if __name__ == "__main__":
+    main()
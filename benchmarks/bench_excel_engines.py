@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Compare the workbook readers of excel_readers.py on sheets shaped like the lab exports.
+
+Workbooks are written with synthetic_corpus.make_sheet (the same layout the pipeline
+benchmark uses), then every installed engine reads each of them --repeat times in
+this process. The best pass per engine is reported as seconds, files/sec and speedup
+over pandas' default engine, and every engine's frames are checked against that default
+(values and dtypes), so a fast reader that changes the normalized output shows up here.
+
+Usage: python benchmarks/bench_excel_engines.py --files 200 [--excel xlsx xls] [--repeat 3]
+"""
+import os, sys, time, argparse, tempfile, shutil
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+import excel_readers as er
+from synthetic_corpus import make_sheet, write_workbook, openpyxl, xlwt
+
+FAST_ENGINES = [e for e in er.ENGINES if e not in ("auto", "openpyxl", "xlrd")]
+
+def write_books(folder, n_files, excel, seed):
+    paths = []
+    for index in range(n_files):
+        stem, grid = make_sheet(index, seed)
+        path = os.path.join(folder, f"{stem}.{excel}")
+        write_workbook(grid, path)
+        paths.append(path)
+    return paths
+
+def same_frame(a, b):
+    return a.shape == b.shape and a.equals(b) and list(a.dtypes) == list(b.dtypes)
+
+def bench_format(paths, repeat):
+    """[(engine, best seconds, mismatching files)] for the engines that can read paths."""
+    default = er.default_engine(paths[0])
+    reference = [er.read_with(default, p) for p in paths]
+    rows = []
+    for engine in er.ENGINES[1:]:
+        if not er.engine_available(engine, paths[0]):
+            continue
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            frames = [er.read_with(engine, p) for p in paths]
+            best = min(best, time.perf_counter() - start)
+        mismatches = sum(not same_frame(ref, got) for ref, got in zip(reference, frames))
+        rows.append((engine, best, mismatches))
+    return default, rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the workbook reader engines.")
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--excel", nargs="+", choices=["xlsx", "xls"], default=["xlsx", "xls"])
+    parser.add_argument("--repeat", type=int, default=3, help="passes per engine; the best is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    writable = {"xlsx": openpyxl is not None, "xls": xlwt is not None}
+    workdir = tempfile.mkdtemp(prefix="bench_excel_")
+    try:
+        for excel in args.excel:
+            if not writable[excel]:
+                print(f".{excel}: skipped ({'openpyxl' if excel == 'xlsx' else 'xlwt'} not installed)")
+                continue
+            folder = os.path.join(workdir, excel)
+            os.makedirs(folder)
+            paths = write_books(folder, args.files, excel, args.seed)
+            default, rows = bench_format(paths, args.repeat)
+            seconds_by_engine = {e: s for e, s, _ in rows}
+            baseline = seconds_by_engine[default]
+            print(f"\n.{excel}, {len(paths)} files (best of {args.repeat})")
+            print(f"{'engine':<16} {'seconds':>8} {'files/s':>9} {'speedup':>8}  output")
+            for engine, seconds, mismatches in rows:
+                check = "same as pandas" if not mismatches else f"{mismatches} files DIFFER"
+                print(f"{engine:<16} {seconds:8.2f} {len(paths) / seconds:9.1f} {baseline / seconds:7.2f}x  {check}")
+            missing = [e for e in FAST_ENGINES if e not in seconds_by_engine]
+            if missing:
+                print(f"not available for .{excel}: {', '.join(missing)}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Compare the original cell-by-cell label normalization with the memoized
+array pass in Extract_all_columns.normalize_labels on a synthetic corpus.
+
+Sheets are built in memory (no Excel parsing) so only the normalization step is timed.
+Usage: python benchmarks/bench_normalize_labels.py --sheets 5000
+"""
+import os, sys, time, random, argparse
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Extract_all_columns as ex
+
+TEST_LABELS = [
+    "GLUCOSE (FASTING)", "SODIUM, SERUM", "POTASSIUM, SERUM", "CHLORIDE (RANDOM URINE) (Urine)",
+    "CREATININE (RANDOM URINE) (Urine)", "PH - URINE (Urine)", "GAMMA GT (GGT)", "URIC ACID, URINE",
+    "CALCIUM, SERUM (Serum)", "APOLIPOPROTEIN B", "OSMOLALITY, SERUM", "URINE MICROALBUMIN (Urine)",
+    "TOTAL PROTEIN", "ALBUMIN", "BILIRUBIN TOTAL", "ALT (SGPT)", "AST (SGOT)", "HbA1c",
+]
+META_CELLS = ["Name", "MRN", "Lab No", "Referred By", "Test Name", "Report Printed On:", "VB LAB"]
+
+def synthetic_sheet(rng, n_tests):
+    """One sheet shaped like a normalized lab export: header block, then label rows."""
+    rows = [[None] * 12 for _ in range(14)]
+    for r, label in zip(range(2, 14, 2), META_CELLS):
+        rows[r][0] = label
+        rows[r][5] = f"value {r}"
+    for label in rng.sample(TEST_LABELS, n_tests):
+        row = [None] * 12
+        row[rng.randrange(3)] = "  " + label + " "
+        row[7] = f"{rng.uniform(0.1, 300):.2f} mmol/L"
+        rows.append(row)
+    rows.append(["*** End of report ***"] + [None] * 11)
+    return pd.DataFrame(rows, dtype=object)
+
+def legacy_normalize(df, file_name):
+    """The original per-cell loop, kept here as the reference implementation."""
+    excluded_names = list(ex.EXCLUDED_NAMES)
+    log_rows = []
+    for col in range(4):
+        for index, value in df.iloc[:, col].dropna().items():
+            if isinstance(value, str):
+                value_stripped = value.strip()
+                if (
+                    value_stripped in excluded_names or
+                    any(char.isdigit() for char in value_stripped) or
+                    "*" in value_stripped or
+                    value_stripped.isnumeric()
+                ):
+                    continue
+                normalized = ex.normalize_name(value_stripped)
+                log_rows.append({"File Name": file_name, "Old Name": value_stripped, "New Name": normalized})
+                df.iat[index, col] = normalized
+    return log_rows
+
+def memoized_normalize(df, file_name):
+    log_rows = []
+    ex.normalize_labels(df, file_name, log_rows)
+    return log_rows
+
+def run(fn, sheets):
+    frames = [df.copy() for df in sheets]
+    start = time.perf_counter()
+    rows = [fn(df, f"sheet_{i}.xls") for i, df in enumerate(frames)]
+    return time.perf_counter() - start, rows, frames
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sheets", type=int, default=5000)
+    parser.add_argument("--tests", type=int, default=12, help="test labels per sheet")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    sheets = [synthetic_sheet(rng, args.tests) for _ in range(args.sheets)]
+
+    t_old, rows_old, frames_old = run(legacy_normalize, sheets)
+    ex._label_cache.clear()
+    t_new, rows_new, frames_new = run(memoized_normalize, sheets)
+
+    assert rows_old == rows_new, "ledger rows differ"
+    assert all(a.equals(b) for a, b in zip(frames_old, frames_new)), "normalized frames differ"
+
+    print(f"sheets: {args.sheets}  ledger rows: {sum(map(len, rows_new))}")
+    print(f"per-cell loop : {t_old:8.2f} s")
+    print(f"memoized pass : {t_new:8.2f} s")
+    print(f"speedup       : {t_old / t_new:8.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Time every pipeline stage on synthetic corpora of increasing size.
+
+For each --sizes N a corpus is written by synthetic_corpus.py (reused when the work
+folder already holds one of that size and seed), then the stages run one after another
+as pipeline.py would run them. Each run reports wall seconds, files/sec and the peak RSS
+of the stage's largest process, and is appended to --results so numbers can be compared
+across commits.
+
+Usage: python benchmarks/bench_pipeline.py --sizes 100 1000 --workers 4
+"""
+import os, sys, csv, json, time, shutil, argparse, subprocess, tempfile
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+import pipeline  # no pandas in this process: forked children would inherit its RSS high-water mark
+
+STAGES = ["extract", "colombia", "dassanach", "impute", "units"]
+RESULT_COLUMNS = ["timestamp", "commit", "files", "stage", "seconds", "files_per_sec", "peak_rss_mb",
+                  "workers", "returncode"]
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "-C", os.path.dirname(BENCH_DIR), "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+def corpus_dir(workdir, n_files, seed, excel, gen_workers):
+    """Folder with an n_files corpus, written unless a matching one is already there."""
+    path = os.path.join(workdir, f"corpus_{n_files}")
+    wanted = {"files": n_files, "seed": seed, "excel": excel, "format": "csv"}
+    marker = os.path.join(path, "corpus.json")
+    if os.path.exists(marker):
+        with open(marker) as fh:
+            if json.load(fh) == wanted:
+                return path
+        shutil.rmtree(path)
+    start = time.perf_counter()
+    subprocess.run([sys.executable, os.path.join(BENCH_DIR, "synthetic_corpus.py"), path, "--files", str(n_files),
+                    "--excel", excel, "--seed", str(seed), "--workers", str(gen_workers)],
+                   check=True, stdout=subprocess.DEVNULL)
+    print(f"corpus of {n_files} files written in {time.perf_counter() - start:.1f}s")
+    return path
+
+def run_measured(argv, cwd, log_path):
+    """Run argv to completion; returns (returncode, seconds, peak RSS in MB of its largest process)."""
+    start = time.perf_counter()
+    with open(log_path, "w") as log:
+        proc = subprocess.Popen(argv, cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+        # wait4 gives this child's own rusage; ru_maxrss also covers its reaped workers
+        _, status, usage = os.wait4(proc.pid, 0)
+    seconds = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    peak = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)  # bytes on macOS, KiB on Linux
+    return proc.returncode, seconds, peak
+
+def bench_size(path, n_files, stages, args, commit):
+    by_name = {s.name: s for s in pipeline.build_stages(args)}
+    rows = []
+    for name in stages:
+        stage = by_name[name]
+        if name == "extract":
+            if not os.listdir(os.path.join(path, "xls")):
+                print(f"{n_files:>7} {name:<10} skipped (corpus has no workbooks)")
+                continue
+            manifest = os.path.join(path, "normalization_manifest.json")
+            if os.path.exists(manifest):
+                os.remove(manifest)  # time a full normalization, not a manifest replay
+        code, seconds, peak = run_measured(stage.argv(), os.path.join(path, stage.cwd),
+                                           os.path.join(path, f"bench_{name}.log"))
+        rate = n_files / seconds if seconds else float("inf")
+        status = "" if code == 0 else f"  FAILED (exit {code}, see bench_{name}.log)"
+        print(f"{n_files:>7} {name:<10} {seconds:9.2f}s {rate:10.1f} files/s {peak:9.1f} MB{status}")
+        rows.append({
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"), "commit": commit,
+            "files": n_files, "stage": name, "seconds": round(seconds, 3), "files_per_sec": round(rate, 1),
+            "peak_rss_mb": round(peak, 1), "workers": args.workers, "returncode": code,
+        })
+    return rows
+
+def append_results(path, rows):
+    new = not os.path.exists(path)
+    with open(path, "a", newline="") as fh:
+        writer = csv.DictWriter(fh, fieldnames=RESULT_COLUMNS)
+        if new:
+            writer.writeheader()
+        writer.writerows(rows)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic corpora.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="--workers/--jobs passed to the stages (default: %(default)s)")
+    parser.add_argument("--excel", choices=["xlsx", "xls", "none"], default="xlsx",
+                        help="raw workbooks to generate; none skips the extract stage (default: xlsx)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--gen-workers", type=int, default=os.cpu_count() or 1,
+                        help="processes writing the corpus (default: all CPUs)")
+    parser.add_argument("--workdir", help="keep corpora here and reuse them (default: a temporary folder)")
+    parser.add_argument("--results", default=os.path.join(BENCH_DIR, "results.csv"),
+                        help="CSV the measurements are appended to (default: %(default)s)")
+    args = parser.parse_args()
+    args.cache = args.intake = None  # pipeline.build_stages options: no extraction cache while timing
+    return args
+
+def main():
+    args = parse_args()
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench_pipeline_")
+    os.makedirs(workdir, exist_ok=True)
+    commit = git_commit()
+    print(f"{'files':>7} {'stage':<10} {'wall':>10} {'rate':>16} {'peak RSS':>12}")
+    try:
+        for n_files in args.sizes:
+            path = corpus_dir(workdir, n_files, args.seed, args.excel, args.gen_workers)
+            rows = bench_size(path, n_files, args.stages, args, commit)
+            append_results(args.results, rows)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    print(f"results appended to {args.results}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Write a synthetic lab-export corpus laid out like the real sheets, for benchmarks.
+
+Every sheet has the patient block at the cells COLOMBIA_AFRICA.metadata_fields(-2) reads,
+test labels in columns 0-2 from row 14 with the result 4 columns over (zero-led files
+also use +5..+7, pH sits at +5 there, and some results spill into the next row), and a
+footer. One file in three is zero-led, the files Dassanach_000Files.py picks up.
+
+The output folder gets what the pipeline expects:
+  xls/                           raw workbooks (.xlsx, or .xls if xlwt is installed)
+  normalized_files/              the per-file CSVs Extract_all_columns.py would write for them
+  normalization_log.csv          its ledger (File Name = workbook)
+  normalization_log_SECOND.csv   the curated ledger (File Name = normalized CSV)
+  COLOMBIA_WITH_META.csv         one META row per file with a few raw biomarker results
+No patient data is involved; every value comes from a seeded RNG, one per file.
+
+Usage: python benchmarks/synthetic_corpus.py OUT_DIR --files 1000 [--excel xlsx|xls|none]
+"""
+import os, sys, json, random, argparse
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Extract_all_columns as ex
+from normalized_io import write_normalized
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+try:
+    import xlwt
+except ImportError:
+    xlwt = None
+
+# Raw label text as printed on the sheets; Extract turns "PH - URINE (Urine)" into PH___URINE__Urine_
+TEST_LABELS = [
+    "GLUCOSE (FASTING)", "SODIUM, SERUM", "POTASSIUM, SERUM", "CHLORIDE, SERUM", "UREA", "CREATININE",
+    "CHLORIDE (RANDOM URINE) (Urine)", "CREATININE (RANDOM URINE) (Urine)", "SODIUM (RANDOM URINE)",
+    "URIC ACID, URINE (Urine)", "URINE PROTEIN", "URINE MICROALBUMIN (Urine)", "GAMMA GT (GGT)",
+    "CALCIUM, SERUM", "CALCIUM, SERUM (Serum)", "APOLIPOPROTEIN B", "OSMOLALITY, SERUM", "TOTAL PROTEIN",
+    "ALBUMIN", "BILIRUBIN TOTAL", "ALT (SGPT)", "AST (SGOT)", "URINE PROTEIN CREATININE RATIO",
+]
+PH_LABEL = "PH - URINE (Urine)"
+NUMERIC_UNITS = ["mmol/L", "umol/l", "g/L", "mg/dl", "IU/L", "U/L", "%", ""]
+QUALITATIVE = ["Negative", "POSITIVE", "TRACE", "NIL"]
+COLS = 20  # sheet width, wide enough for label col 2 + offset 7
+
+# Header block: (row, label col, label, value col); value cols match metadata_fields(-2).
+# Age sits in column 7 so Dassanach's label scan (first 8 columns) can see it; zero-led
+# files also carry a "Sex" row there, since their Gender label is out of its reach.
+HEADER = [
+    (2, 0, "Name", 3), (4, 0, "MRN", 3), (6, 0, "Lab No", 3), (8, 0, "Referred By", 3),
+    (2, 7, "Age", 10), (2, 12, "Gender", 14),
+    (6, 8, "Collected On", 10), (6, 12, "Received On", 14), (8, 8, "Reported On", 10),
+]
+
+def file_stem(index):
+    return f"{index:07d}" if index % 3 == 0 else f"C{index:06d}"
+
+def result_text(rng, label):
+    if label == PH_LABEL:
+        return f"{rng.choice([5, 5.5, 6, 6.5, 7, 7.5, 8])}"
+    if rng.random() < 0.08:
+        return rng.choice(QUALITATIVE)
+    value = f"{rng.uniform(0.1, 400):.{rng.choice([0, 1, 2])}f}"
+    if rng.random() < 0.05:
+        value = f"{rng.randint(1, 9)},{rng.randint(100, 999)}"  # thousands separator
+    if label.endswith("RATIO"):
+        return f"{value}:1"
+    unit = rng.choice(NUMERIC_UNITS)
+    return f"{value} {unit}".strip()
+
+def make_sheet(index, seed=0):
+    """(stem, grid) for one file; grid is a list of rows of str/None cells."""
+    rng = random.Random(seed * 1_000_003 + index)
+    zero_led = index % 3 == 0
+    n_tests = rng.randint(6, 18)
+    grid = [[None] * COLS for _ in range(14 + 2 * n_tests + 2)]
+
+    grid[0][0] = "VARIBIO LAB"
+    for row, label_col, label, _ in HEADER:
+        grid[row][label_col] = label
+    grid[2][3] = rng.choice(["JOHN", "JANE", "AMINA", "PETER", "GRACE"]) + " " + rng.choice(["DOE", "ODHIAMBO", "WANJIRU"])
+    grid[4][3] = str(100000 + index)
+    grid[6][3] = f"L{index}"
+    grid[8][3] = rng.choice(["Dr X", "Dr Y", "VB DOCTOR"])
+    grid[2][10] = str(rng.randint(1, 90))
+    grid[2][14] = rng.choice(["Male", "Female"])
+    if zero_led:
+        grid[10][0], grid[10][3] = "Sex", grid[2][14]
+    for row, col in [(6, 10), (6, 14), (8, 10)]:
+        grid[row][col] = f"2021-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    grid[12][0] = "Test Name"
+    grid[12][4] = "Result"
+
+    labels = rng.sample(TEST_LABELS, n_tests - 1) + [PH_LABEL]
+    rng.shuffle(labels)
+    row = 14
+    for label in labels:
+        col = 0 if rng.random() < 0.8 else rng.randrange(1, 3)
+        grid[row][col] = label if rng.random() < 0.9 else f" {label}  "
+        if label == PH_LABEL and zero_led:
+            offset = 5  # the pH quirk of zero-led files
+        elif zero_led:
+            offset = rng.choice([4, 4, 4, 5, 6, 7])
+        else:
+            offset = 4
+        if zero_led and rng.random() < 0.05:
+            grid[row + 1][rng.randrange(COLS)] = result_text(rng, label)  # value on the next row
+        else:
+            grid[row][col + offset] = result_text(rng, label)
+        row += 2 if rng.random() < 0.3 else 1
+    grid[row][0] = "*** End of report ***"
+    grid[row + 1][0] = "Processed by :-"
+    return file_stem(index), trim(grid)
+
+def trim(grid):
+    """Drop trailing empty rows/columns, as read_excel would."""
+    rows = [i for i, r in enumerate(grid) if any(v is not None for v in r)]
+    cols = [j for r in grid for j, v in enumerate(r) if v is not None]
+    return [r[:max(cols) + 1] for r in grid[:max(rows) + 1]]
+
+def write_workbook(grid, path):
+    if path.endswith(".xls"):
+        book = xlwt.Workbook()
+        sheet = book.add_sheet("Sheet1")
+        for r, row in enumerate(grid):
+            for c, value in enumerate(row):
+                if value is not None:
+                    sheet.write(r, c, value)
+        book.save(path)
+    else:
+        book = openpyxl.Workbook(write_only=True)
+        sheet = book.create_sheet()
+        for row in grid:
+            sheet.append(row)
+        book.save(path)
+
+def write_one(index, out_dir, seed, excel, fmt):
+    """Write one file's workbook and normalized sheet; returns its ledger rows."""
+    stem, grid = make_sheet(index, seed)
+    workbook = f"{stem}.{excel if excel != 'none' else 'xlsx'}"
+    if excel != "none":
+        write_workbook(grid, os.path.join(out_dir, "xls", workbook))
+    # the same type inference read_excel applies to the cells (numeric-looking text -> numbers)
+    df = TextParser(grid, header=None).read()
+    log_rows = []
+    ex.normalize_labels(df, workbook, log_rows)
+    write_normalized(df, os.path.join(out_dir, "normalized_files", stem + ".csv"), fmt)
+    return log_rows
+
+def meta_row(index, seed):
+    rng = random.Random(seed * 7_000_003 + index)
+    return {
+        "file_name": file_stem(index) + ".csv",
+        "mrn": 100000 + index,
+        "Age": rng.randint(1, 90),
+        "GLUCOSE__FASTING_": result_text(rng, "GLUCOSE (FASTING)"),
+        "UREA": result_text(rng, "UREA") if rng.random() < 0.9 else None,
+        "SODIUM__SERUM": result_text(rng, "SODIUM, SERUM"),
+        "URINE_PROTEIN_CREATININE_RATIO": result_text(rng, "URINE PROTEIN CREATININE RATIO"),
+    }
+
+def write_corpus(out_dir, n_files, excel="xlsx", seed=0, workers=1, fmt="csv"):
+    """Write an n_files corpus into out_dir (see module docstring) and return its description."""
+    if excel == "xlsx" and openpyxl is None:
+        raise SystemExit("writing .xlsx needs openpyxl")
+    if excel == "xls" and xlwt is None:
+        raise SystemExit("writing .xls needs xlwt (pip install xlwt), or use --excel xlsx")
+    os.makedirs(os.path.join(out_dir, "xls"), exist_ok=True)
+    os.makedirs(os.path.join(out_dir, "normalized_files"), exist_ok=True)
+
+    indices = range(n_files)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            per_file = list(pool.map(write_one, indices, repeat(out_dir), repeat(seed), repeat(excel),
+                                     repeat(fmt), chunksize=max(1, n_files // (workers * 8))))
+    else:
+        per_file = [write_one(i, out_dir, seed, excel, fmt) for i in indices]
+
+    ledger = pd.DataFrame([row for rows in per_file for row in rows],
+                          columns=["File Name", "Old Name", "New Name"])
+    ledger.to_csv(os.path.join(out_dir, "normalization_log.csv"), index=False)
+    # the curated ledger names the normalized CSVs
+    curated = ledger.assign(**{"File Name": ledger["File Name"].str.replace(r"\.xlsx?$", ".csv", regex=True)})
+    curated.to_csv(os.path.join(out_dir, "normalization_log_SECOND.csv"), index=False)
+    pd.DataFrame([meta_row(i, seed) for i in indices]).to_csv(
+        os.path.join(out_dir, "COLOMBIA_WITH_META.csv"), index=False)
+
+    info = {"files": n_files, "seed": seed, "excel": excel, "format": fmt}
+    with open(os.path.join(out_dir, "corpus.json"), "w") as fh:
+        json.dump(info, fh)
+    return info
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic lab-export corpus.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--excel", choices=["xlsx", "xls", "none"], default="xlsx",
+                        help="raw workbook format; none writes only the normalized side (default: xlsx)")
+    parser.add_argument("--format", choices=["csv", "feather", "parquet"], default="csv",
+                        help="normalized sheet format (default: csv)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    info = write_corpus(args.out_dir, args.files, args.excel, args.seed, args.workers, args.format)
+    print(f"Wrote {info['files']} files to {args.out_dir}")
+
+if __name__ == "__main__":
+    main()
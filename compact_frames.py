@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Compact dtypes for the wide output tables of UNITS_Retained.py and Dassanach_000Files.py.
+
+Those tables hold a value and a <col>_UNITS column per biomarker, and almost every units
+cell is one of a dozen labels ("no_units", "mmol/L", "qual", ...). In memory:
+  - units columns become Categoricals sharing one category set (the canonical labels from
+    unit_parsing plus whatever else the table holds), so a cell is a 1-byte code;
+  - value columns become float32 when every value in them keeps its shortest decimal
+    form, so the CSV text is unchanged (5.6 stays "5.6"); others stay float64;
+  - low-cardinality text metadata (Gender, Sex, referred_by, ...) becomes categorical.
+Written as CSV the table is byte-identical to the object/float64 one. write_table() can
+also write Parquet, which keeps these dtypes and loads back compact.
+"""
+import os
+import numpy as np
+import pandas as pd
+from unit_parsing import UNIT_MAP
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet output is optional; CSVs always work
+    pa = pq = None
+
+TABLE_FORMATS = {"csv": ".csv", "parquet": ".parquet"}
+# every label split_value_and_unit returns besides free-text units kept for auditing
+UNIT_LABELS = sorted(set(UNIT_MAP.values()) | {"no_units", "qual", "ratio", "unitless"})
+META_CATEGORY_RATIO = 0.5  # text metadata with at most this share of distinct values goes categorical
+
+def parquet_available():
+    return pq is not None
+
+def float32_safe(values):
+    """Whether every value of a float column survives float32 with its shortest decimal text unchanged."""
+    distinct = pd.unique(values[~np.isnan(values)])
+    if not len(distinct):
+        return True
+    as32 = distinct.astype(np.float32)
+    if not np.isfinite(as32).all():
+        return False
+    return bool((as32.astype(str).astype(np.float64) == distinct).all())
+
+def compact_values(series):
+    """float64 -> float32 where float32_safe; anything else is returned as is."""
+    if series.dtype == np.float64 and float32_safe(series.to_numpy()):
+        return series.astype(np.float32)
+    return series
+
+def compact_units(series):
+    """A units column as a Categorical (own categories; share_unit_categories() unifies them)."""
+    return series.astype("category")
+
+def share_unit_categories(df, units_cols):
+    """Give every units column the same category set: UNIT_LABELS plus any other label seen."""
+    seen = set(UNIT_LABELS)
+    for c in units_cols:
+        seen.update(df[c].cat.categories)
+    shared = pd.CategoricalDtype(sorted(seen))
+    for c in units_cols:
+        df[c] = df[c].cat.set_categories(shared.categories)
+    return df
+
+def compact_metadata(series, max_ratio=META_CATEGORY_RATIO):
+    """Text columns with few distinct values (Gender, Sex, ...) -> categorical; ids and numbers stay."""
+    if not (series.dtype == object or pd.api.types.is_string_dtype(series.dtype)):
+        return series
+    present = series.dropna()
+    if not len(present) or not all(isinstance(v, str) for v in present.unique()):
+        return series
+    if present.nunique() > max_ratio * len(present):
+        return series
+    return series.astype("category")
+
+def compact_frame(df, value_cols, units_cols, meta_cols=(), float32=True):
+    """Apply the compact dtypes to df's value, units and metadata columns (in place); returns df."""
+    for c in units_cols:
+        df[c] = compact_units(df[c])
+    share_unit_categories(df, units_cols)
+    if float32:
+        for c in value_cols:
+            df[c] = compact_values(df[c])
+    for c in meta_cols:
+        df[c] = compact_metadata(df[c])
+    return df
+
+def table_path(path, fmt):
+    """path with the suffix of fmt (out.csv -> out.parquet)."""
+    return os.path.splitext(path)[0] + TABLE_FORMATS[fmt]
+
+def write_table(df, path, fmt="csv"):
+    """Write a finished table as CSV or Parquet; returns the path written."""
+    if fmt == "csv":
+        df.to_csv(path, index=False)
+        return path
+    if not parquet_available():
+        raise ImportError(f"pyarrow is required for --format {fmt}")
+    path = table_path(path, fmt)
+    df.to_parquet(path, index=False)
+    return path
+
+class ParquetAppender:
+    """
+    Append same-schema chunks to one Parquet file, one row group per chunk. The schema
+    is fixed by the first chunk; categorical columns are stored with 32-bit dictionary
+    indices and all-missing columns as text, so later chunks cast onto it.
+    """
+    def __init__(self, path):
+        if not parquet_available():
+            raise ImportError("pyarrow is required for Parquet output")
+        self.path = path
+        self.schema = None
+        self._writer = None
+
+    def _fixed_schema(self, schema):
+        fields = []
+        for field in schema:
+            if pa.types.is_dictionary(field.type):
+                field = field.with_type(pa.dictionary(pa.int32(), field.type.value_type))
+            elif pa.types.is_null(field.type):
+                field = field.with_type(pa.large_string())
+            fields.append(field)
+        return pa.schema(fields, metadata=schema.metadata)
+
+    def write(self, df):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is None:
+            self.schema = self._fixed_schema(table.schema)
+            self._writer = pq.ParquetWriter(self.path, self.schema)
+        self._writer.write_table(table.cast(self.schema))
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class ChunkedParquetWriter:
+    """ChunkedCSVWriter's interface (write_row/flush/close) over a ParquetAppender, units as categoricals."""
+    def __init__(self, path, columns, units_cols, chunk_rows=1000):
+        self.path = table_path(path, "parquet")
+        self.columns = list(columns)
+        self.units_cols = list(units_cols)
+        self.chunk_rows = max(1, int(chunk_rows))
+        self.rows_written = 0
+        self._buffer = []
+        self._parquet = ParquetAppender(self.path)
+
+    def write_row(self, row):
+        self._buffer.append(row)
+        if len(self._buffer) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._write_chunk()
+
+    def _write_chunk(self):
+        chunk = pd.DataFrame(self._buffer, columns=self.columns)
+        for c in self.units_cols:
+            chunk[c] = compact_units(chunk[c])
+        self._parquet.write(share_unit_categories(chunk, self.units_cols))
+        self.rows_written += len(self._buffer)
+        self._buffer = []
+
+    def close(self):
+        if self._buffer or self._parquet.schema is None:
+            self._write_chunk()  # an empty table still gets its columns
+        self._parquet.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+def memory_mb(df):
+    return df.memory_usage(deep=True).sum() / 1e6
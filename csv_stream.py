@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Append rows to a CSV in bounded chunks instead of building one big DataFrame.
+
+The column schema is fixed up front, so every chunk is written with the same
+header/column order and peak memory depends on chunk_rows, not on the number of files.
+Chunks are written as object columns, so every value is written as it was extracted
+(5 stays "5", 5.0 stays "5.0") instead of by a dtype inferred anew for each chunk.
+"""
+import pandas as pd
+
+class ChunkedCSVWriter:
+    def __init__(self, path, columns, chunk_rows=1000):
+        self.path = path
+        self.columns = list(columns)
+        self.chunk_rows = max(1, int(chunk_rows))
+        self.rows_written = 0
+        self._buffer = []
+        # header only; chunks are appended below it
+        pd.DataFrame(columns=self.columns).to_csv(self.path, index=False)
+
+    def write_row(self, row):
+        """Queue one row dict; keys outside the schema are dropped, missing keys become empty."""
+        self._buffer.append(row)
+        if len(self._buffer) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        chunk = pd.DataFrame(self._buffer, columns=self.columns, dtype=object)
+        chunk.to_csv(self.path, mode="a", header=False, index=False)
+        self.rows_written += len(self._buffer)
+        self._buffer = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Pluggable readers for the raw lab workbooks (first sheet, no header).
+
+Engines, fastest first:
+  calamine         pandas' calamine engine (needs python-calamine); .xls and .xlsx; opt-in only
+  xlsx-stream      the first sheet's XML fed straight to openpyxl's sheet parser, skipping
+                   load_workbook (stylesheet/workbook objects), which is most of the cost
+                   on small sheets; .xlsx only
+  openpyxl-stream  openpyxl read-only with values_only rows: skips the per-cell objects
+                   pandas' openpyxl engine builds; .xlsx only
+  openpyxl         pd.read_excel's default for .xlsx
+  xlrd             pd.read_excel's engine for .xls
+The two stream engines apply pandas' openpyxl cell conversion and the same row trimming
+and type inference, so they return the frame pd.read_excel(header=None) would.
+"auto" tries xlsx-stream on .xlsx files and falls back to the pandas default for the
+extension if it is unavailable or fails on a file (printing the file and the error).
+xlsx-stream drives openpyxl's private WorkSheetParser, so "auto" only uses it on the
+openpyxl release series it was checked against (XLSX_STREAM_OPENPYXL); --engine
+xlsx-stream still selects it on any other. calamine has not been checked against
+pd.read_excel on the lab workbooks (see benchmarks/bench_excel_engines.py), so it is
+only used when asked for with --engine calamine.
+"""
+import os
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+try:
+    import openpyxl
+    from openpyxl.cell.cell import ERROR_CODES
+    from openpyxl.reader.strings import read_string_table
+    from openpyxl.styles.numbers import builtin_format_code, is_date_format, is_timedelta_format
+    from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900
+    from openpyxl.worksheet._reader import WorkSheetParser
+except ImportError:
+    openpyxl = None
+    ERROR_CODES = ()
+try:
+    import python_calamine
+except ImportError:
+    python_calamine = None
+
+ENGINES = ["auto", "calamine", "xlsx-stream", "openpyxl-stream", "openpyxl", "xlrd"]
+XLS_SUFFIXES = (".xls",)
+XLSX_STREAM_OPENPYXL = {(3, 1)}  # openpyxl (major, minor) read_xlsx_stream matched pd.read_excel on
+
+def xlsx_stream_checked():
+    """Whether the installed openpyxl is a release series xlsx-stream was checked against."""
+    if openpyxl is None:
+        return False
+    version = re.match(r"(\d+)\.(\d+)", openpyxl.__version__)
+    return version is not None and tuple(map(int, version.groups())) in XLSX_STREAM_OPENPYXL
+
+def default_engine(path):
+    return "xlrd" if path.lower().endswith(XLS_SUFFIXES) else "openpyxl"
+
+def engine_available(engine, path):
+    """Whether engine is installed and can read path's format."""
+    xls = path.lower().endswith(XLS_SUFFIXES)
+    if engine == "calamine":
+        return python_calamine is not None
+    if engine in ("xlsx-stream", "openpyxl-stream"):
+        return openpyxl is not None and not xls
+    return engine == default_engine(path)
+
+def candidates(path, engine="auto"):
+    """Engines to try for path, in order; always ends with the pandas default."""
+    if engine == "auto":
+        wanted = ["xlsx-stream"] if xlsx_stream_checked() else []
+    else:
+        wanted = [engine]
+    order = [e for e in wanted if engine_available(e, path)]
+    return order + [e for e in [default_engine(path)] if e not in order]
+
+def _stream_cell(value):
+    """pandas' openpyxl _convert_cell, for values_only rows."""
+    if value is None:
+        return ""  # compat with xlrd
+    if type(value) is float:
+        as_int = int(value)
+        return as_int if as_int == value else value
+    if type(value) is str and value in ERROR_CODES:
+        return float("nan")  # error cells (values_only hands back their code as text)
+    return value
+
+def _frame(rows):
+    """pandas' row trimming/padding and TextParser inference over converted rows."""
+    data = []
+    last_row_with_data = -1
+    for row_number, row in enumerate(rows):
+        converted = [_stream_cell(v) for v in row]
+        while converted and converted[-1] == "":
+            converted.pop()  # trim trailing empty cells
+        if converted:
+            last_row_with_data = row_number
+        data.append(converted)
+    data = data[:last_row_with_data + 1]
+    if not data:
+        return pd.DataFrame()
+    width = max(len(r) for r in data)
+    data = [r + [""] * (width - len(r)) for r in data]
+    return TextParser(data, header=None).read()
+
+def read_openpyxl_stream(path):
+    """First sheet of an .xlsx as read_excel(header=None) would return it."""
+    book = openpyxl.load_workbook(path, read_only=True, data_only=True, keep_links=False)
+    try:
+        sheet = book.worksheets[0]
+        sheet.reset_dimensions()  # don't trust the stored dimensions, like pandas
+        return _frame(sheet.iter_rows(values_only=True))
+    finally:
+        book.close()
+
+# --- xlsx-stream: the package parts openpyxl would read for the first worksheet ---
+NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+NS_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+def _workbook_parts(archive):
+    """(first worksheet part, shared strings part or None, styles part or None, epoch)."""
+    book = ET.fromstring(archive.read("xl/workbook.xml"))
+    rels = ET.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    targets = {}
+    for rel in rels.iter(NS_PKG_REL + "Relationship"):
+        target = rel.get("Target")
+        part = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+        targets[rel.get("Id")] = (rel.get("Type", "").rsplit("/", 1)[-1], part)
+    sheet = next(part for sheet in book.iter(NS_MAIN + "sheet")
+                 for kind, part in [targets[sheet.get(NS_REL + "id")]] if kind == "worksheet")
+    by_kind = {kind: part for kind, part in targets.values()}
+    pr = book.find(NS_MAIN + "workbookPr")
+    date1904 = pr is not None and pr.get("date1904", "").lower() in ("1", "true")
+    epoch = CALENDAR_MAC_1904 if date1904 else CALENDAR_WINDOWS_1900
+    return sheet, by_kind.get("sharedStrings"), by_kind.get("styles"), epoch
+
+def _date_styles(xml):
+    """Indexes of the cell styles (cellXfs) whose number format is a date / a timedelta."""
+    styles = ET.fromstring(xml)
+    custom = {int(f.get("numFmtId")): f.get("formatCode")
+              for f in styles.iterfind(f"{NS_MAIN}numFmts/{NS_MAIN}numFmt")}
+    dates, deltas = set(), set()
+    for idx, xf in enumerate(styles.iterfind(f"{NS_MAIN}cellXfs/{NS_MAIN}xf")):
+        num_fmt = int(xf.get("numFmtId", 0))
+        fmt = custom[num_fmt] if num_fmt in custom else builtin_format_code(num_fmt)
+        if is_date_format(fmt):
+            dates.add(idx)
+        if is_timedelta_format(fmt):
+            deltas.add(idx)
+    return dates, deltas
+
+def _sheet_rows(parser):
+    """Rows as openpyxl's read-only iter_rows(values_only=True) yields them without dimensions."""
+    counter = 1
+    for idx, cells in parser.parse():
+        for _ in range(counter, idx):  # rows missing from the file
+            counter += 1
+            yield ()
+        if counter <= idx:
+            counter += 1
+            if not cells:
+                yield ()
+                continue
+            row = [None] * cells[-1]["column"]
+            for cell in cells:
+                row[cell["column"] - 1] = cell["value"]
+            yield row
+
+def read_xlsx_stream(path):
+    """First sheet of an .xlsx as read_excel(header=None) would return it, without load_workbook."""
+    with zipfile.ZipFile(path) as archive:
+        sheet_part, strings_part, styles_part, epoch = _workbook_parts(archive)
+        shared = []
+        if strings_part and strings_part in archive.namelist():
+            with archive.open(strings_part) as src:
+                shared = read_string_table(src)
+        dates, deltas = _date_styles(archive.read(styles_part)) if styles_part else (set(), set())
+        with archive.open(sheet_part) as src:
+            parser = WorkSheetParser(src, shared, data_only=True, epoch=epoch,
+                                     date_formats=dates, timedelta_formats=deltas)
+            return _frame(_sheet_rows(parser))
+
+def read_with(engine, path):
+    if engine == "xlsx-stream":
+        return read_xlsx_stream(path)
+    if engine == "openpyxl-stream":
+        return read_openpyxl_stream(path)
+    return pd.read_excel(path, header=None, engine=engine)
+
+def read_sheet(path, engine="auto"):
+    """
+    Read the first sheet of a workbook with header=None, trying the engines from
+    candidates(path, engine) in turn. Errors from a faster engine are printed and fall
+    through to the next one; the pandas default's error is the one raised if everything fails.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    order = candidates(path, engine)
+    for engine_name, next_engine in zip(order, order[1:]):
+        try:
+            return read_with(engine_name, path)
+        except Exception as e:
+            print(f"{engine_name} could not read {path} ({type(e).__name__}: {e}); trying {next_engine}")
+    return read_with(order[-1], path)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+On-disk cache of per-file extraction results, shared by COLOMBIA_AFRICA.py,
+Dassanach_000Files.py and Impute_PH_URINE.py.
+
+Entries live in one SQLite file and are keyed by
+    (extractor name, content hash of the normalized file, hash of its file name and
+     expected test set, hash of the extractor config)
+so a rerun only re-extracts files whose content, ledger rows or extraction rules changed.
+The name is part of the key because results carry it (File Name columns, warnings), so
+identical sheets saved under two names each keep their own entry.
+Content hashes are remembered per path with size/mtime, so unchanged files are not re-read
+just to be hashed. Only the parent process touches the database; workers never see it.
+pipeline.py runs several extractors at once on one cache file, so the database is in WAL
+mode (readers don't block the writer) and a connection waits up to BUSY_TIMEOUT_S for a
+lock held by another process instead of failing with "database is locked".
+"""
+import hashlib
+import os
+import pickle
+import sqlite3
+
+from normalized_io import resolve_normalized
+
+BUSY_TIMEOUT_S = 120  # how long to wait for another process's write to finish
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_hashes (
+    path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha256 TEXT
+);
+CREATE TABLE IF NOT EXISTS extractions (
+    extractor TEXT, file_sha256 TEXT, expected_sha256 TEXT, config_sha256 TEXT, result BLOB,
+    PRIMARY KEY (extractor, file_sha256, expected_sha256, config_sha256)
+);
+"""
+
+def digest(obj):
+    """Stable sha256 of a repr-able value (tuples/lists/strings/numbers)."""
+    return hashlib.sha256(repr(obj).encode("utf-8")).hexdigest()
+
+def file_sha256(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+class ExtractionCache:
+    """
+    cache = ExtractionCache("extraction_cache.sqlite", "colombia", config)
+    key = cache.key(csv_path, expected_tests)   # None if the file does not exist
+    hit = cache.get(key)                        # None on a miss
+    cache.put(key, result)                      # written on close()
+    """
+    def __init__(self, path, extractor, config):
+        self.path = path
+        self.extractor = extractor
+        self.config_sha256 = digest(config)
+        self.hits = self.misses = 0
+        self._pending = []
+        self._hashes = []
+        self._db = sqlite3.connect(path, timeout=BUSY_TIMEOUT_S)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def content_hash(self, file_path):
+        """sha256 of the file, re-read only when its size or mtime changed since last time."""
+        stat = os.stat(file_path)
+        path = os.path.abspath(file_path)
+        row = self._db.execute("SELECT size, mtime_ns, sha256 FROM file_hashes WHERE path = ?",
+                               (path,)).fetchone()
+        if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+        sha = file_sha256(file_path)
+        self._hashes.append((path, stat.st_size, stat.st_mtime_ns, sha))
+        return sha
+
+    def key(self, csv_path, expected=()):
+        """Cache key for a normalized sheet (addressed by its ".csv" name) and its expected tests."""
+        path = resolve_normalized(csv_path)
+        if path is None:
+            return None
+        return (self.content_hash(path), digest((os.path.basename(csv_path), sorted(expected))))
+
+    def get(self, key):
+        if key is not None:
+            row = self._db.execute(
+                "SELECT result FROM extractions WHERE extractor = ? AND file_sha256 = ?"
+                " AND expected_sha256 = ? AND config_sha256 = ?",
+                (self.extractor, key[0], key[1], self.config_sha256)).fetchone()
+            if row is not None:
+                self.hits += 1
+                return pickle.loads(row[0])
+        self.misses += 1
+        return None
+
+    def put(self, key, result):
+        if key is not None:
+            self._pending.append((self.extractor, key[0], key[1], self.config_sha256,
+                                  pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)))
+
+    def close(self):
+        """Write queued hashes and results in one transaction."""
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?)", self._hashes)
+            self._db.executemany("INSERT OR REPLACE INTO extractions VALUES (?, ?, ?, ?, ?)", self._pending)
+        self._db.close()
+        self._hashes, self._pending = [], []
+
+    def summary(self):
+        return f"Extraction cache {self.path}: {self.hits} hits, {self.misses} extracted"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
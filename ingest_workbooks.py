@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Stage the lab workbooks into ./xls once per content (replaces move_files.sh).
+
+Every .xls/.xlsx under the sources (by default the sub-folders of ./xls, where exports
+land) and at the top of ./xls is hashed, in parallel. Each distinct content is staged
+once at the top of ./xls:
+  - under its own name, or <stem>_<first 8 hex of its sha256><ext> when that stem is
+    taken by different content in any case and either extension (both would become
+    <stem>.csv; keeps the leading "0" Dassanach_000Files.py selects on);
+  - as a reflink (copy-on-write clone) where the filesystem supports it, else a hardlink,
+    else a copy; --mode move moves the file instead, as move_files.sh did.
+Identical exports are not staged again. Every file seen is recorded in
+./xls/ingest_map.csv (path, size, mtime, sha256, status, staged_as), which also lets the
+next run skip re-hashing unchanged files. Status is one of:
+  staged     the copy of its content in ./xls (staged_as is its name there)
+  source     a file under a source folder whose content is staged as staged_as
+  duplicate  a file at the top of ./xls with the same content as staged_as;
+             Extract_all_columns.py skips these while both files are unchanged
+             since the map was written, so no content is parsed twice
+"""
+import argparse
+import csv
+import errno
+import hashlib
+import os
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; staging falls back to hardlinks/copies
+    fcntl = None
+
+WORKBOOK_SUFFIXES = (".xls", ".xlsx")
+INGEST_MAP = "ingest_map.csv"
+MAP_COLUMNS = ["path", "size", "mtime_ns", "sha256", "status", "staged_as"]
+MODES = ["auto", "reflink", "hardlink", "copy", "move"]
+FICLONE = 0x40049409  # Linux ioctl: clone src into dst (btrfs, xfs, ...)
+
+def is_workbook(name):
+    return name.lower().endswith(WORKBOOK_SUFFIXES) and not name.startswith("~$")  # skip Excel lock files
+
+def file_sha256(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def load_map(path):
+    """{path: row} from the previous run, or {}."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, newline="") as fh:
+        return {row["path"]: row for row in csv.DictReader(fh)}
+
+def save_map(path, rows):
+    tmp = path + ".tmp"
+    with open(tmp, "w", newline="") as fh:
+        writer = csv.DictWriter(fh, fieldnames=MAP_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp, path)
+
+def unchanged_since_map(row, path):
+    """Whether path still has the size and mtime row of the ingest map recorded for it."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    return int(row["size"]) == stat.st_size and int(row["mtime_ns"]) == stat.st_mtime_ns
+
+def duplicate_names(dest):
+    """
+    {name: staged_as} for the files at the top of dest whose content is staged under
+    another name. Only files that, like their staged copy, are unchanged since the ingest
+    map was written are listed; anything touched since must be read again.
+    """
+    rows = load_map(os.path.join(dest, INGEST_MAP)).values()
+    staged = {r["staged_as"]: r for r in rows if r["status"] == "staged"}
+    return {os.path.basename(r["path"]): r["staged_as"] for r in rows
+            if r["status"] == "duplicate" and r["staged_as"] in staged
+            and unchanged_since_map(r, os.path.join(dest, os.path.basename(r["path"])))
+            and unchanged_since_map(staged[r["staged_as"]], os.path.join(dest, r["staged_as"]))}
+
+def find_workbooks(dest, sources):
+    """(files at the top of dest, files under the sources), both sorted."""
+    staged = sorted(os.path.normpath(os.path.join(dest, f)) for f in os.listdir(dest)
+                    if is_workbook(f) and os.path.isfile(os.path.join(dest, f)))
+    found = set()
+    for source in sources:
+        top = os.path.abspath(source) == os.path.abspath(dest)
+        for root, dirs, files in os.walk(source):
+            if top and os.path.abspath(root) == os.path.abspath(dest):
+                continue  # the top of dest is what is already staged
+            found.update(os.path.normpath(os.path.join(root, f)) for f in files if is_workbook(f))
+    return staged, sorted(found)
+
+def hash_all(paths, previous, workers):
+    """{path: (size, mtime_ns, sha256)}; unchanged files keep the sha256 of the previous run."""
+    stats = {p: os.stat(p) for p in paths}
+    known, todo = {}, []
+    for p in paths:
+        old = previous.get(p)
+        if old and int(old["size"]) == stats[p].st_size and int(old["mtime_ns"]) == stats[p].st_mtime_ns:
+            known[p] = old["sha256"]
+        else:
+            todo.append(p)
+    # hashlib releases the GIL on large blocks, so threads hash files in parallel
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        known.update(zip(todo, pool.map(file_sha256, todo)))
+    return {p: (stats[p].st_size, stats[p].st_mtime_ns, known[p]) for p in paths}, len(todo)
+
+def staged_name(name, sha, taken):
+    """
+    name, or <stem>_<sha[:8]><ext> if its stem is taken (then <stem>_<sha[:8]>_2<ext>, ...
+    if that is taken too); the extension is lower-cased. taken holds lower-cased stems:
+    0001.xls and 0001.XLSX would both be normalized to 0001.csv.
+    """
+    base, ext = os.path.splitext(name)
+    ext = ext.lower()
+    stem = base
+    suffix, n = f"_{sha[:8]}", 1
+    while stem.lower() in taken:
+        stem = f"{base}{suffix}{'' if n == 1 else f'_{n}'}"
+        n += 1
+    return stem + ext
+
+def reflink(src, dst):
+    if fcntl is None:
+        raise OSError(errno.ENOSYS, "reflinks need fcntl")
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+
+def stage_file(src, dst, mode):
+    """Put src's content at dst; returns how ("reflink", "hardlink", "copy" or "move")."""
+    if mode == "move":
+        shutil.move(src, dst)
+        return "move"
+    tmp = dst + ".part"  # never leave a half-written workbook where Extract would read it
+    tries = ["reflink", "hardlink", "copy"] if mode == "auto" else [mode]
+    for how in tries:
+        try:
+            if how == "reflink":
+                reflink(src, tmp)
+            elif how == "hardlink":
+                os.link(src, tmp)
+            else:
+                shutil.copy2(src, tmp)
+            os.replace(tmp, dst)
+            return how
+        except OSError as e:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            if mode != "auto" or e.errno not in (errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL,
+                                                 errno.EPERM, errno.EMLINK, errno.ENOSYS):
+                raise
+    raise OSError(f"could not stage {src}")
+
+def ingest(dest, sources, mode="auto", workers=4, dry_run=False):
+    """Stage every new content found under sources into dest; returns a {status/how: count} summary."""
+    os.makedirs(dest, exist_ok=True)
+    map_path = os.path.join(dest, INGEST_MAP)
+    previous = load_map(map_path)
+    staged_paths, source_paths = find_workbooks(dest, sources)
+    info, hashed = hash_all(staged_paths + source_paths, previous, workers)
+
+    by_sha = {}    # sha256 -> name staged in dest
+    taken = set()  # lower-cased stems at the top of dest (each is one normalized sheet)
+    rows = []
+    counts = {"hashed": hashed}
+
+    def record(path, status, name):
+        size, mtime_ns, sha = info[path]
+        rows.append({"path": path, "size": size, "mtime_ns": mtime_ns, "sha256": sha,
+                     "status": status, "staged_as": name})
+        counts[status] = counts.get(status, 0) + 1
+
+    # what is already in dest: the first file (by name) of each content is the staged copy
+    for path in staged_paths:
+        name, sha = os.path.basename(path), info[path][2]
+        taken.add(os.path.splitext(name)[0].lower())
+        if sha in by_sha:
+            record(path, "duplicate", by_sha[sha])
+        else:
+            by_sha[sha] = name
+            record(path, "staged", name)
+
+    for path in source_paths:
+        sha = info[path][2]
+        moved = False
+        if sha in by_sha:
+            counts["known"] = counts.get("known", 0) + 1  # this content is in dest already
+        else:
+            name = staged_name(os.path.basename(path), sha, taken)
+            new_path = os.path.normpath(os.path.join(dest, name))
+            if dry_run:
+                info[new_path] = info[path]
+            else:
+                how = stage_file(path, new_path, mode)
+                counts[how] = counts.get(how, 0) + 1
+                moved = how == "move"
+                stat = os.stat(new_path)
+                info[new_path] = (stat.st_size, stat.st_mtime_ns, sha)
+            print(f"{path} -> {name}")
+            by_sha[sha] = name
+            taken.add(os.path.splitext(name)[0].lower())
+            record(new_path, "staged", name)
+            counts["new"] = counts.get("new", 0) + 1
+        if not moved:
+            record(path, "source", by_sha[sha])
+
+    if not dry_run:
+        save_map(map_path, rows)
+    return counts
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Stage each distinct lab workbook once into ./xls.")
+    parser.add_argument("--dest", default="./xls",
+                        help="folder Extract_all_columns.py reads (default: %(default)s)")
+    parser.add_argument("--source", action="append", metavar="DIR",
+                        help="folder to collect workbooks from, searched recursively; repeatable "
+                             "(default: the sub-folders of --dest)")
+    parser.add_argument("--mode", choices=MODES, default="auto",
+                        help="how to stage a file: auto tries reflink, hardlink, then copy; "
+                             "move removes the source like move_files.sh (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="threads hashing files (default: %(default)s)")
+    parser.add_argument("--dry-run", action="store_true", help="only print what would be staged")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    sources = args.source or [args.dest]
+    try:
+        counts = ingest(args.dest, sources, args.mode, args.workers, args.dry_run)
+    except OSError as e:
+        raise SystemExit(f"Staging failed: {e}")
+    how = ", ".join(f"{counts[h]} {h}" for h in MODES if counts.get(h))
+    print(f"{counts.get('new', 0)} new workbooks staged into {args.dest}" + (f" ({how})" if how else "") +
+          f"; {counts.get('known', 0)} found with content already staged, "
+          f"{counts.get('duplicate', 0)} duplicates at the top of {args.dest}, {counts['hashed']} files hashed")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Opt-in per-file timings and cProfile dumps for the cleaning scripts.
+
+Every script takes --timings FILE (per-file read / label-scan / extraction / write
+seconds, as CSV, or JSON when FILE ends in .json) and --profile FILE (cProfile stats of
+the parent process, readable with `python -m pstats FILE`). The environment variables
+CLEANING_TIMINGS and CLEANING_PROFILE set the same options without touching the command;
+the script's name is added to those paths (t.json -> t_COLOMBIA_AFRICA.json), so the
+stages pipeline.py runs at the same time don't overwrite each other's files.
+
+Timers are created where a file is processed (also inside worker processes) and their
+records are returned to the parent with the results. Without --timings the functions
+get NULL_TIMER, whose phases are no-ops.
+"""
+import cProfile
+import csv
+import json
+import os
+import time
+from contextlib import contextmanager, nullcontext
+
+TIMINGS_ENV = "CLEANING_TIMINGS"
+PROFILE_ENV = "CLEANING_PROFILE"
+PHASES = ["read", "scan", "extract", "write"]
+
+class FileTimer:
+    """Seconds spent per phase on one file, plus a few notes (sheet shape, cache hit, ...)."""
+    def __init__(self, label):
+        self.label = label
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.notes = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - start
+
+    def note(self, **notes):
+        self.notes.update(notes)
+
+    def record(self):
+        row = {"file": self.label}
+        row.update({f"{name}_s": round(s, 6) for name, s in self.seconds.items()})
+        row["total_s"] = round(sum(self.seconds.values()), 6)
+        row.update(self.notes)
+        return row
+
+class NullTimer:
+    """Stand-in when timings are off: phases cost one attribute lookup."""
+    _null = nullcontext()
+
+    def phase(self, name):
+        return self._null
+
+    def note(self, **notes):
+        pass
+
+NULL_TIMER = NullTimer()
+
+def run_timed(fn, *args, label_arg=0, **kwargs):
+    """
+    fn(*args, timer=FileTimer(args[label_arg])) -> (result, timing record).
+    Top-level, so partial(run_timed, fn, label_arg=...) can go through a process pool.
+    """
+    timer = FileTimer(os.path.basename(str(args[label_arg])))
+    result = fn(*args, timer=timer, **kwargs)
+    return result, timer.record()
+
+def collect_timed(results, report):
+    """Yield results, moving the records of (result, record) pairs into report; without a report they pass through."""
+    if report is None:
+        yield from results
+        return
+    for result, record in results:
+        report.add(record)
+        yield result
+
+class TimingReport:
+    """Collects per-file records in the parent and writes them out at the end of a run."""
+    def __init__(self, script):
+        self.script = script
+        self.records = []
+        self.started = time.perf_counter()
+
+    def add(self, record):
+        if record is not None:
+            self.records.append(record)
+
+    def totals(self):
+        return {f"{name}_s": round(sum(r.get(f"{name}_s", 0.0) for r in self.records), 6) for name in PHASES}
+
+    def write(self, path, slowest=5):
+        wall = time.perf_counter() - self.started
+        if path.endswith(".json"):
+            with open(path, "w") as fh:
+                json.dump({"script": self.script, "wall_s": round(wall, 6), "totals": self.totals(),
+                           "files": self.records}, fh, indent=1)
+        else:
+            columns = list(dict.fromkeys(k for r in self.records for k in r))
+            with open(path, "w", newline="") as fh:
+                writer = csv.DictWriter(fh, fieldnames=columns)
+                writer.writeheader()
+                writer.writerows(self.records)
+        print(f"Timings for {len(self.records)} files saved to {path} (wall {wall:.2f}s)")
+        for r in sorted(self.records, key=lambda r: r["total_s"], reverse=True)[:slowest]:
+            print(f"  {r['total_s']:8.3f}s  {r['file']}")
+
+@contextmanager
+def profiled(path):
+    """cProfile the enclosed block into path (no-op when path is empty)."""
+    if not path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(f"cProfile stats saved to {path}")
+
+def env_path(var, prog):
+    """The path in environment variable var with the script name added before its suffix, or None."""
+    path = os.environ.get(var)
+    if not path:
+        return None
+    stem, ext = os.path.splitext(path)
+    return f"{stem}_{os.path.splitext(os.path.basename(prog))[0]}{ext}"
+
+def add_instrumentation_args(parser):
+    parser.add_argument("--timings", metavar="FILE", default=env_path(TIMINGS_ENV, parser.prog),
+                        help=f"write per-file phase timings to FILE (.json or .csv; env {TIMINGS_ENV})")
+    parser.add_argument("--profile", metavar="FILE", default=env_path(PROFILE_ENV, parser.prog),
+                        help=f"dump cProfile stats of the main process to FILE (env {PROFILE_ENV})")
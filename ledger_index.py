@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Load a normalization ledger (File Name / Old Name / New Name) once and index it
+by file name, so per-file lookups of the expected test names are O(1) instead of
+a scan of the whole ledger for every file.
+"""
+import pandas as pd
+
+def load_ledger(path):
+    """Read the ledger as text and return (log, file_name_column, new_name_column)."""
+    log = pd.read_csv(path, dtype=str)
+    # normalize column names
+    log.columns = [c.strip() for c in log.columns]
+    fn_col = next((c for c in log.columns if c.lower() in ("file name", "file_name")), None)
+    new_col = next((c for c in log.columns if c.lower() in ("new name", "new_name")), None)
+    if fn_col is None or new_col is None:
+        raise ValueError("Normalization log must have 'File Name' and 'New Name' columns.")
+    return log, fn_col, new_col
+
+def build_ledger_index(log, fn_col="File Name", new_col="New Name"):
+    """
+    {file name: frozenset of its New Names}, keys in order of first appearance
+    in the ledger. Files whose rows carry no New Name map to an empty frozenset.
+    """
+    names = log.dropna(subset=[new_col]).groupby(fn_col, sort=False)[new_col].agg(frozenset)
+    return {fn: names.get(fn, frozenset()) for fn in log[fn_col].dropna().unique()}
+
+def load_ledger_index(path):
+    log, fn_col, new_col = load_ledger(path)
+    return build_ledger_index(log, fn_col, new_col)
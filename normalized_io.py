@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Read/write helpers for the per-file sheets in ./normalized_files.
+
+Extract_all_columns.py writes each sheet either as a headerless CSV (default) or as a
+columnar Feather/Parquet file with every cell stored as the text the CSV would hold.
+Consumers keep addressing files by their ".csv" name; read_normalized() picks the
+columnar sibling when one exists and falls back to the CSV; a columnar sheet without
+pyarrow installed raises ImportError rather than being skipped.
+"""
+import os
+import pandas as pd
+
+try:
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+    PYARROW_ERROR = None
+except ImportError as e:  # columnar formats are optional; CSVs always work
+    feather = pq = None
+    PYARROW_ERROR = e
+
+COLUMNAR_FORMATS = {"feather": ".feather", "parquet": ".parquet"}
+OUTPUT_FORMATS = ["csv"] + list(COLUMNAR_FORMATS)
+
+# read_csv's default na_values: applied to columnar files so both formats read back alike
+CSV_NA_STRINGS = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+]
+
+def columnar_available():
+    return feather is not None
+
+def sibling_paths(csv_path):
+    """All on-disk names a normalized sheet may have, columnar first."""
+    stem = os.path.splitext(csv_path)[0]
+    return [stem + ext for ext in COLUMNAR_FORMATS.values()] + [stem + ".csv"]
+
+def require_pyarrow(columnar_paths):
+    """
+    Raise ImportError naming columnar_paths when pyarrow is missing. Columnar sheets have
+    no CSV copy (write_normalized removes it), so skipping them would silently drop files.
+    """
+    if columnar_paths and not columnar_available():
+        raise ImportError(
+            f"{len(columnar_paths)} Feather/Parquet sheet(s) need pyarrow, e.g. {columnar_paths[0]}: "
+            f"{PYARROW_ERROR}"
+        ) from PYARROW_ERROR
+
+def resolve_normalized(csv_path):
+    """Return the file that read_normalized would load for csv_path, or None if there is none."""
+    paths = [p for p in sibling_paths(csv_path) if os.path.exists(p)]
+    if paths and paths[0].endswith(".csv"):
+        return paths[0]
+    require_pyarrow(paths)
+    return paths[0] if paths else None
+
+def list_normalized(folder):
+    """
+    Sorted ".csv" names (as paths) of every normalized sheet in folder, whatever its format.
+    Raises ImportError if any are Feather/Parquet and pyarrow is missing.
+    """
+    names = sorted(f for f in os.listdir(folder) if f.endswith((".csv",) + tuple(COLUMNAR_FORMATS.values())))
+    require_pyarrow([os.path.join(folder, f) for f in names if not f.endswith(".csv")])
+    stems = {os.path.splitext(f)[0] for f in names}
+    return sorted(os.path.join(folder, stem + ".csv") for stem in stems)
+
+def write_normalized(df, csv_path, fmt="csv"):
+    """
+    Save a normalized sheet in fmt and remove stale copies in the other formats.
+    Returns the path written.
+    """
+    if fmt == "csv":
+        path = csv_path
+        df.to_csv(path, index=False, header=False)
+    else:
+        if not columnar_available():
+            raise ImportError(f"pyarrow is required for --format {fmt}")
+        path = os.path.splitext(csv_path)[0] + COLUMNAR_FORMATS[fmt]
+        # every cell as the text to_csv would write; missing cells stay null
+        cells = df.astype(str).where(df.notna(), None)
+        cells.columns = [str(c) for c in range(cells.shape[1])]
+        if fmt == "feather":
+            cells.to_feather(path, compression="uncompressed")  # uncompressed -> memory-mappable
+        else:
+            cells.to_parquet(path, index=False)
+
+    for other in sibling_paths(csv_path):
+        if other != path and os.path.exists(other):
+            os.remove(other)
+    return path
+
+def _infer_like_csv(column):
+    """Numeric columns become numbers, as read_csv would have parsed them."""
+    try:
+        return pd.to_numeric(column)
+    except (ValueError, TypeError):
+        return column
+
+def read_normalized(csv_path, dtype=None, **csv_kwargs):
+    """
+    Load a normalized sheet headerless, preferring its columnar copy.
+    dtype=str keeps every cell as text; otherwise numeric columns are inferred.
+    csv_kwargs only apply when falling back to the CSV.
+    """
+    path = resolve_normalized(csv_path)
+    if path is None:
+        raise FileNotFoundError(csv_path)
+    if path.endswith(".csv"):
+        return pd.read_csv(path, header=None, dtype=dtype, **csv_kwargs)
+
+    reader = feather if path.endswith(COLUMNAR_FORMATS["feather"]) else pq
+    df = reader.read_table(path, memory_map=True).to_pandas()
+    df.columns = range(df.shape[1])
+    df = df.mask(df.isin(CSV_NA_STRINGS))
+    if dtype is None:
+        df = df.apply(_infer_like_csv)
+    return df
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Run the cleaning scripts as one dependency graph.
+
+Each stage declares the files/folders it reads and writes; a stage depends on the
+stages that write its inputs. A stage is skipped when its command, its code and the
+fingerprints of its inputs match the last successful run (kept in .pipeline_state.json)
+and its outputs still exist, so an upstream rerun that rewrites identical files does
+not cascade. Stages whose dependencies are done run concurrently, e.g.
+the Dassanach extraction alongside the Colombia combine. Each stage's output goes to
+pipeline_logs/<stage>.log and a wall-time table is printed at the end.
+
+Two inputs are still prepared by hand and are never produced here:
+normalization_log_SECOND.csv (the curated ledger) and COLOMBIA_WITH_META.csv
+(combined_output.csv merged with the cohort META). Stages needing a missing one are
+reported as blocked.
+
+Run it from the data folder (the one holding ./xls); the scripts are taken from the
+folder this file lives in.
+"""
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = ".pipeline_state.json"
+LOG_DIR = "pipeline_logs"
+
+# helper modules every extraction script imports
+SHARED_CODE = ["normalized_io.py", "ledger_index.py", "csv_stream.py", "extraction_cache.py"]
+
+class Stage:
+    def __init__(self, name, cmd, inputs, outputs, code=(), cwd="."):
+        self.name = name
+        self.cmd = cmd          # argv; a leading "*.py" is run with this interpreter from SCRIPT_DIR
+        self.inputs = inputs    # files/folders read, relative to the data folder
+        self.outputs = outputs  # files/folders written
+        self.code = code        # scripts/modules (in SCRIPT_DIR) whose changes force a rerun
+        self.cwd = cwd
+
+    def argv(self):
+        head, rest = self.cmd[0], self.cmd[1:]
+        if head.endswith(".py"):
+            return [sys.executable, os.path.join(SCRIPT_DIR, head)] + rest
+        if head.endswith(".sh"):
+            return ["bash", os.path.join(SCRIPT_DIR, head)] + rest
+        return list(self.cmd)
+
+def build_stages(args):
+    """The pipeline graph; extra flags from the command line are passed to the scripts."""
+    cache = ["--cache", args.cache] if args.cache else []
+    intake = args.intake or []
+    return [
+        # stage each distinct workbook from the sub-folders of ./xls (and any --intake folder) once
+        Stage("gather",
+              ["ingest_workbooks.py", "--dest", "xls", "--workers", str(args.workers)]
+              + [a for d in intake for a in ("--source", d)] + (["--source", "xls"] if intake else []),
+              ["xls"] + intake, ["xls"], code=["ingest_workbooks.py"]),
+        Stage("extract",
+              ["Extract_all_columns.py", "--input-dir", "xls", "--output-dir", "normalized_files",
+               "--log", "normalization_log.csv", "--workers", str(args.workers)],
+              ["xls"], ["normalized_files", "normalization_log.csv"],
+              code=["Extract_all_columns.py", "normalized_io.py", "excel_readers.py", "ingest_workbooks.py"]),
+        Stage("colombia",
+              ["COLOMBIA_AFRICA.py", "--ledger", "normalization_log_SECOND.csv",
+               "--normalized-dir", "normalized_files", "--output", "combined_output.csv",
+               "--error-log", "error_log.txt"] + cache,
+              ["normalization_log_SECOND.csv", "normalized_files"], ["combined_output.csv", "error_log.txt"],
+              code=["COLOMBIA_AFRICA.py", "prefetch.py"] + SHARED_CODE),
+        Stage("dassanach",
+              ["Dassanach_000Files.py", "--input-dir", "normalized_files",
+               "--ledger", "normalization_log_SECOND.csv", "--output", "DASSANACH_combined.csv",
+               "--error-log", "extract_00xx_errors.log", "--jobs", str(args.workers)] + cache,
+              ["normalization_log_SECOND.csv", "normalized_files"],
+              ["DASSANACH_combined.csv", "extract_00xx_errors.log"],
+              code=["Dassanach_000Files.py", "unit_parsing.py", "compact_frames.py", "prefetch.py",
+                    "sheet_layouts.py"] + SHARED_CODE),
+        Stage("impute",
+              ["Impute_PH_URINE.py", "--meta", "COLOMBIA_WITH_META.csv", "--normalized-dir", "normalized_files",
+               "--output", "META_updated_FINAL_COLOMBIA.csv", "--workers", str(args.workers)] + cache,
+              ["COLOMBIA_WITH_META.csv", "normalized_files"], ["META_updated_FINAL_COLOMBIA.csv"],
+              code=["Impute_PH_URINE.py"] + SHARED_CODE),
+        Stage("units",
+              ["UNITS_Retained.py", "--input", "META_updated_FINAL_COLOMBIA.csv",
+               "--output", "META_updated_FINAL_COLOMBIA_UNITS_DIVIDED.csv"],
+              ["META_updated_FINAL_COLOMBIA.csv"], ["META_updated_FINAL_COLOMBIA_UNITS_DIVIDED.csv"],
+              code=["UNITS_Retained.py", "unit_parsing.py", "compact_frames.py"]),
+    ]
+
+# ---------------- fingerprints ----------------
+def file_sha256(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def fingerprint(path):
+    """Files by content hash; folders by (relative path, size, mtime) of everything below them."""
+    if os.path.isfile(path):
+        return file_sha256(path)
+    if os.path.isdir(path):
+        h = hashlib.sha256()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                stat = os.stat(full)
+                h.update(f"{os.path.relpath(full, path)}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+        return h.hexdigest()
+    return None
+
+def stage_fingerprint(stage):
+    return {
+        "cmd": stage.cmd,
+        "code": {c: fingerprint(os.path.join(SCRIPT_DIR, c)) for c in stage.code},
+        "inputs": {i: fingerprint(i) for i in stage.inputs},
+    }
+
+def load_state(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as fh:
+        return json.load(fh)
+
+def save_state(state, path):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as fh:
+        json.dump(state, fh, indent=1)
+    os.replace(tmp, path)
+
+# ---------------- scheduling ----------------
+def dependencies(stages):
+    """{stage name: set of stage names that write one of its inputs}."""
+    writers = {}
+    for stage in stages:
+        for out in stage.outputs:
+            writers.setdefault(out, []).append(stage.name)
+    order = {stage.name: i for i, stage in enumerate(stages)}
+    deps = {}
+    for stage in stages:
+        # only earlier stages count, so a stage that rewrites its own input (gather) has no cycle
+        deps[stage.name] = {w for i in stage.inputs for w in writers.get(i, [])
+                            if order[w] < order[stage.name]}
+    return deps
+
+def run_stage(stage):
+    """Run one stage, its output going to LOG_DIR/<name>.log; returns (returncode, seconds)."""
+    os.makedirs(LOG_DIR, exist_ok=True)
+    start = time.perf_counter()
+    with open(os.path.join(LOG_DIR, f"{stage.name}.log"), "w") as log:
+        proc = subprocess.run(stage.argv(), cwd=stage.cwd, stdout=log, stderr=subprocess.STDOUT)
+    return proc.returncode, time.perf_counter() - start
+
+def run_pipeline(stages, state_path=STATE_FILE, force=False, max_parallel=2, dry_run=False):
+    """Returns {stage name: (status, seconds)}; status is ran/skipped/failed/blocked."""
+    state = {} if force else load_state(state_path)
+    deps = dependencies(stages)
+    by_name = {stage.name: stage for stage in stages}
+    report = {}
+    pending = [stage.name for stage in stages]
+    running = {}
+    planned = set()  # dry run: outputs of the stages that would run, as if they had
+
+    def ready(name):
+        return all(report.get(d, ("",))[0] in ("ran", "skipped") for d in deps[name])
+
+    def settled(name):
+        return all(d in report for d in deps[name])
+
+    max_parallel = max(1, max_parallel)
+    with ThreadPoolExecutor(max_workers=max_parallel) as pool:
+        while pending or running:
+            for name in [n for n in pending if settled(n)]:
+                if len(running) >= max_parallel:
+                    break  # checked again once a running stage finishes
+                pending.remove(name)
+                stage = by_name[name]
+                if not ready(name):
+                    report[name] = ("blocked", 0.0)
+                    print(f"[{name}] blocked: an upstream stage did not finish")
+                    continue
+                missing = [i for i in stage.inputs if not os.path.exists(i) and i not in planned]
+                if missing:
+                    report[name] = ("blocked", 0.0)
+                    print(f"[{name}] blocked: missing input {', '.join(missing)}")
+                    continue
+                # an upstream rerun that left its outputs unchanged does not force this stage
+                up_to_date = (not force and state.get(name) == stage_fingerprint(stage)
+                              and all(os.path.exists(o) for o in stage.outputs))
+                if dry_run and any(report[d][0] == "ran" for d in deps[name]):
+                    up_to_date = False  # the upstream stage has not actually rewritten anything yet
+                if up_to_date:
+                    report[name] = ("skipped", 0.0)
+                    print(f"[{name}] up to date")
+                    continue
+                if dry_run:
+                    report[name] = ("ran", 0.0)
+                    planned.update(stage.outputs)
+                    print(f"[{name}] would run: {' '.join(stage.cmd)}")
+                    continue
+                print(f"[{name}] running: {' '.join(stage.cmd)}")
+                running[pool.submit(run_stage, stage)] = name
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                returncode, seconds = future.result()
+                if returncode == 0:
+                    report[name] = ("ran", seconds)
+                    # inputs are fingerprinted after the run: gather rewrites its own input
+                    state[name] = stage_fingerprint(by_name[name])
+                    save_state(state, state_path)
+                    print(f"[{name}] done in {seconds:.1f}s")
+                else:
+                    report[name] = ("failed", seconds)
+                    print(f"[{name}] FAILED (exit {returncode}) after {seconds:.1f}s, "
+                          f"see {os.path.join(LOG_DIR, name + '.log')}")
+    return {stage.name: report[stage.name] for stage in stages}
+
+def print_report(report, wall):
+    print(f"\n{'stage':<10} {'status':<8} {'seconds':>8}")
+    for name, (status, seconds) in report.items():
+        print(f"{name:<10} {status:<8} {seconds:>8.1f}")
+    print(f"{'total':<10} {'':<8} {wall:>8.1f}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the lab-file cleaning pipeline, skipping up-to-date stages.")
+    parser.add_argument("--force", action="store_true", help="ignore the saved state and run every stage")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would run")
+    parser.add_argument("--parallel", type=int, default=2,
+                        help="stages allowed to run at the same time (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes inside each extraction stage (default: %(default)s)")
+    parser.add_argument("--cache", metavar="FILE",
+                        help="extraction cache passed to the Colombia, Dassanach and Impute stages")
+    parser.add_argument("--intake", action="append", metavar="DIR",
+                        help="extra folder the gather stage collects workbooks from; repeatable")
+    parser.add_argument("--skip-gather", action="store_true",
+                        help="leave ./xls as it is (do not run ingest_workbooks.py)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    stages = build_stages(args)
+    if args.skip_gather:
+        stages = [s for s in stages if s.name != "gather"]
+    start = time.perf_counter()
+    report = run_pipeline(stages, force=args.force, max_parallel=args.parallel, dry_run=args.dry_run)
+    print_report(report, time.perf_counter() - start)
+    return 1 if any(status in ("failed", "blocked") for status, _ in report.values()) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
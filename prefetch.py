@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Read-ahead for the serial per-file loops of COLOMBIA_AFRICA.py and Dassanach_000Files.py.
+
+prefetched(load, items, depth) hands items back in their original order, each with a
+future for load(item), while up to depth of the following items are already being
+loaded on a small thread pool. Reading a normalized file is mostly waiting on storage
+(and pandas' parsers release the GIL), so the next reads overlap the current file's
+extraction. At most depth loaded items wait beside the one being processed, so memory
+stays capped. future.result() returns the load or raises its exception, so per-file
+error handling stays where it was. depth=0 loads each item inline, as before: result()
+itself does the load, so it is timed wherever the caller times the wait.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+class _Inline:
+    """Future stand-in for depth=0: result() runs the load there and then."""
+    def __init__(self, load, item):
+        self._load, self._item = load, item
+
+    def result(self):
+        return self._load(self._item)
+
+def prefetched(load, items, depth=2):
+    """Yield (item, future of load(item)) in order, loading up to depth items ahead."""
+    if depth <= 0:
+        for item in items:
+            yield item, _Inline(load, item)
+        return
+    items = iter(items)
+    pool = ThreadPoolExecutor(max_workers=depth, thread_name_prefix="prefetch")
+    ahead = deque((item, pool.submit(load, item)) for item in islice(items, depth))
+    try:
+        while ahead:
+            item, future = ahead.popleft()
+            for nxt in islice(items, 1):  # keep depth loads in flight behind this one
+                ahead.append((nxt, pool.submit(load, nxt)))
+            yield item, future
+    finally:
+        for _, future in ahead:
+            future.cancel()
+        pool.shutdown(wait=True)
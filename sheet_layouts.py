@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Report-template fingerprints for the per-file extractor in Dassanach_000Files.py.
+
+The lab exports come from a handful of report templates. A template fixes the header
+block of a sheet -- the metadata block, the "Test Name" row that heads the results, the
+column count -- while the result rows below it change from
+patient to patient. layout_fingerprint() hashes that structure: the column count, the
+header row and the positions of the non-blank cells down to it (positions only, not text).
+
+TemplateCache keeps what an extractor resolved on one sheet (where a label's result
+sits) under the sheet's fingerprint, so the next sheet of the same template is read at
+those coordinates directly. Callers check what they take from the cache against the
+sheet in hand (a result is still where the probe would stop) and fall back to their
+generic scan where it does not hold.
+"""
+import hashlib
+import numpy as np
+import pandas as pd
+
+HEADER_LABEL = "test name"  # first cell of the row heading the results table
+
+def header_row(values, scan_cols=None):
+    """Row of the "Test Name" cell in the first scan_cols columns (default: all), or None."""
+    block = values[:, :scan_cols]
+    for r, c in zip(*np.nonzero(pd.notna(block))):  # row-major, so the first one wins
+        v = block[r, c]
+        if isinstance(v, str) and v.strip().lower() == HEADER_LABEL:
+            return int(r)
+    return None
+
+def layout_fingerprint(values, scan_cols=None):
+    """Hex digest of the template a sheet (an object array) follows; None without a header row."""
+    top = header_row(values, scan_cols)
+    if top is None:
+        return None
+    block = pd.notna(values[:top + 1])
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.array([values.shape[1], top], dtype=np.int64).tobytes())
+    h.update(np.packbits(block).tobytes())  # the header row and column count fix block's shape
+    return h.hexdigest()
+
+class TemplateCache:
+    """
+    {fingerprint: layout} for one run. A layout is a dict the caller fills with what it
+    resolved for that template; hits and misses count the lookups it answered or not.
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._layouts = {}
+
+    def layout(self, fingerprint):
+        """The (mutable) layout of a template, new and empty on first sight; None when disabled or unknown."""
+        if not self.enabled or fingerprint is None:
+            return None
+        return self._layouts.setdefault(fingerprint, {})
+
+    def summary(self, what="cells"):
+        return (f"Layout cache: {len(self._layouts)} templates, {self.hits} {what} read at cached "
+                f"coordinates, {self.misses} resolved by scanning")
@@ -0,0 +1,49 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from COLOMBIA_AFRICA import process_files_with_normalization
+
+SHEETS = {
+    # duplicates whose merged name is absent stay under their own name; a "Missing" calcium variant is kept
+    "0001.csv": [("APOLIPOPROTEIN_B", "1.1"), ("URIC_ACID__URINE__Urine_", "2.5"),
+                 ("CALCIUM__SERUM", "Missing"), ("SODIUM__SERUM", "140")],
+    # both names of a duplicate pair are present and merged; a calcium variant is consolidated
+    "0002.csv": [("OSMOLALITY__SERUM", "290"), ("OSMOLALITY__SERUM__Serum_", "291"),
+                 ("CALCIUM__SERUM__Serum_", "2.3")],
+    "0003.csv": [("URINE_MICROALBUMIN__Urine_", "<5"), ("SODIUM__SERUM", "141")],
+}
+
+def write_sheet(path, tests):
+    grid = [[None] * 8 for _ in range(14 + len(tests))]
+    grid[2][3] = "JANE DOE"
+    for row, (name, value) in enumerate(tests, start=14):
+        grid[row][0], grid[row][4] = name, value
+    pd.DataFrame(grid).to_csv(path, index=False, header=False)
+
+def test_stream_matches_in_memory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # error_log.txt
+    folder = tmp_path / "normalized_files"
+    folder.mkdir()
+    rows = []
+    for file_name, tests in SHEETS.items():
+        write_sheet(folder / file_name, tests)
+        rows += [{"File Name": file_name, "Old Name": name, "New Name": name} for name, _ in tests]
+    ledger = tmp_path / "ledger.csv"
+    pd.DataFrame(rows).to_csv(ledger, index=False)
+
+    outputs, errors = [], []
+    for stream in (False, True):
+        output = tmp_path / f"out{stream:d}.csv"
+        process_files_with_normalization(str(ledger), str(folder), str(output), stream=stream, chunk_rows=2)
+        outputs.append(pd.read_csv(output, dtype=str, keep_default_na=False))
+        errors.append((tmp_path / "error_log.txt").read_text())
+    in_memory, streamed = outputs
+
+    assert set(in_memory.columns) <= set(streamed.columns)
+    extra = streamed.columns.difference(in_memory.columns)
+    assert (streamed[extra] == "").all().all()  # ledger names no row kept
+    assert streamed[in_memory.columns].equals(in_memory)
+    assert errors[0] == errors[1]
@@ -0,0 +1,40 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from COLOMBIA_AFRICA import process_files_with_normalization
+from extraction_cache import ExtractionCache
+
+def write_sheet(path):
+    grid = [[None] * 8 for _ in range(16)]
+    grid[2][3] = "JANE DOE"
+    grid[14][0], grid[14][4] = "SODIUM__SERUM", "140"
+    pd.DataFrame(grid).to_csv(path, index=False)
+
+def test_same_content_under_two_names_keeps_both_names(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # error_log.txt
+    folder = tmp_path / "normalized_files"
+    folder.mkdir()
+    for name in ("0001.csv", "0002.csv"):
+        write_sheet(folder / name)
+    ledger = tmp_path / "ledger.csv"
+    pd.DataFrame({"File Name": ["0001.csv", "0002.csv"], "Old Name": ["Sodium"] * 2,
+                  "New Name": ["SODIUM__SERUM"] * 2}).to_csv(ledger, index=False)
+    cache = str(tmp_path / "cache.sqlite")
+
+    outputs = []
+    for run in range(2):  # the second run is served entirely from the cache
+        output = str(tmp_path / f"out{run}.csv")
+        process_files_with_normalization(str(ledger), str(folder), output, cache_path=cache)
+        outputs.append(pd.read_csv(output))
+    assert list(outputs[1]["File Name"]) == ["0001.csv", "0002.csv"]
+    assert outputs[0].equals(outputs[1])
+
+def test_key_includes_file_name(tmp_path):
+    for name in ("0001.csv", "0002.csv"):
+        write_sheet(tmp_path / name)
+    with ExtractionCache(str(tmp_path / "cache.sqlite"), "test", ()) as cache:
+        a, b = (cache.key(str(tmp_path / name), ["SODIUM__SERUM"]) for name in ("0001.csv", "0002.csv"))
+    assert a[0] == b[0] and a != b
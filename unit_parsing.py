@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Value/unit parsing shared by UNITS_Retained.py and Dassanach_000Files.py.
+
+split_value_and_unit() turns a raw result such as "5.6 mmol/L" into (5.6, "mmol/L").
+Scalar calls go through a bounded LRU cache keyed on (column class, raw string);
+split_values_and_units() applies the same rules to a whole column at once.
+"""
+import re
+from functools import lru_cache
+
+import pandas as pd
+import numpy as np
+
+# helpers to seperate the values and units surgically .Dr Muhoya style
+
+num_regex = re.compile(r"""
+    ^\s*                # leading spaces
+    (?P<num>[+-]?\d{1,3}(?:,\d{3})*|\d+)   # int with optional thousands
+    (?:\.\d+)?          # optional decimals
+    (?:[eE][+-]?\d+)?   # optional scientific notation
+""", re.VERBOSE)
+
+def clean_numeric(s):
+    """Extract leading numeric, return float or NaN."""
+    if pd.isna(s):
+        return np.nan
+    s = str(s).strip()
+    m = num_regex.match(s)
+    if not m:
+        # handle ratio like "1.97 :1"
+        ratio_match = re.match(r"^\s*([+-]?\d+(?:\.\d+)?)\s*:?\s*1\s*$", s)
+        if ratio_match:
+            return float(ratio_match.group(1))
+        # pH like "5" or "5.6" already matched above; purely qualitative -> NaN
+        return np.nan
+    num = m.group(0)
+    num = num.replace(",", "")
+    try:
+        return float(num)
+    except:
+        return np.nan
+
+# canonical unit mapping (add as needed)
+UNIT_MAP = {
+    # molarity
+    "mmol/l": "mmol/L",
+    "μmol/l": "umol/L",
+    "umol/l": "umol/L",
+    # activity
+    "iu/l": "IU/L",
+    # mass concentration
+    "mg/dl": "mg/dL",
+    "g/dl":  "g/dL",
+    "g/l":   "g/L",
+    # osmolality
+    "mosmol/kg": "mOsmol/kg",
+    "mosm/kg":   "mOsmol/kg",
+    "mosmolkg":  "mOsmol/kg",
+}
+
+def normalize_unit(raw_unit, col_name, raw_value_str):
+    """Standardize unit text; handle special cases."""
+    if raw_unit is None:
+        raw_unit = ""
+    unit = str(raw_unit)
+
+    # grab substring after the numeric prefix
+    if isinstance(raw_value_str, str):
+        m = num_regex.match(raw_value_str.strip())
+        if m:
+            unit = raw_value_str[m.end():]
+        else:
+            # no number present -> qualitative?
+            unit = raw_value_str
+
+    # tidy punctuation/casing/spaces
+    unit = unit.strip()
+    unit = unit.replace(".", " ").replace("·", " ")
+    unit = re.sub(r"\s+", " ", unit)
+    unit = unit.replace(" /", "/").replace("/ ", "/")
+    unit = unit.replace(" l", "/L").replace(" L", "/L")  # mild rescue
+    unit = unit.lower()
+    unit = unit.replace("µ", "u")  # normalize micro symbol
+    unit = unit.replace("umol/ l", "umol/l")  # common spacing glitch
+
+    # special cases by column
+    if col_name.lower().startswith("ph"):
+        return "unitless"
+    if "ratio" in col_name.lower() or re.search(r"\d\s*:\s*1$", str(raw_value_str)):
+        return "ratio"
+    if unit in ("", " ", None):
+        return "no_units"
+
+    # strip leading junk like ":" or residual spaces
+    unit = unit.strip(" :;")
+
+    # collapse weird 'mg dL', 'mg  dL' forms -> mg/dL
+    unit = unit.replace("mg dl", "mg/dl").replace("g dl", "g/dl")
+
+    # map to canonical
+    canon = UNIT_MAP.get(unit)
+    if canon:
+        return canon
+
+    # heuristic rescues
+    if "umol" in unit:
+        return "umol/L"
+    if "mmol" in unit:
+        return "mmol/L"
+    if "iu" in unit:
+        return "IU/L"
+    if "mg" in unit and "dl" in unit:
+        return "mg/dL"
+    if "g" in unit and "/l" in unit:
+        return "g/L"
+    if "osmol" in unit:
+        return "mOsmol/kg"
+
+    # qualitative?
+    if re.fullmatch(r"(negative|pos|positive|trace|tr|nil|none)", unit.strip(), flags=re.I):
+        return "qual"
+
+    return unit  # leave as-is so we can audit later
+
+def column_class(col_name):
+    """
+    The only thing normalize_unit reads from a column name: "ph" (starts with ph),
+    "ratio" (contains ratio) or "other". Passing the class back in as the column
+    name gives the same result as the original name.
+    """
+    lower = col_name.lower()
+    if lower.startswith("ph"):
+        return "ph"
+    if "ratio" in lower:
+        return "ratio"
+    return "other"
+
+def _split_stripped(col_class, s):
+    """split_value_and_unit for an already-stripped string; wrapped in an LRU cache below."""
+    val = clean_numeric(s)
+
+    # classify unit
+    unit = normalize_unit(None, col_class, s)
+
+    # qualitative only (no number)
+    if pd.isna(val):
+        # If it looks like pH written as plain number-less? Rare; keep as qualitative.
+        if unit == "unitless":
+            return np.nan, "unitless"
+        # e.g., "Negative"
+        return np.nan, "qual" if unit not in ("no_units",) else "no_units"
+
+    # have a numeric value
+    if unit in ("", "no_units"):
+        unit = "no_units"
+
+    return val, unit
+
+# Raw values such as "5.6 mmol/L" repeat many thousands of times across files and columns
+UNIT_CACHE_SIZE = 1 << 16
+_split_cached = lru_cache(maxsize=UNIT_CACHE_SIZE)(_split_stripped)
+
+def split_value_and_unit(s, col_name):
+    """Return numeric_value, unit_label according to rules (cached per column class + raw value)."""
+    if pd.isna(s):
+        return np.nan, "no_units"
+    return _split_cached(column_class(col_name), str(s).strip())
+
+def unit_cache_info():
+    """Hit/miss counters of the split cache (functools CacheInfo), for sizing it."""
+    return _split_cached.cache_info()
+
+def configure_unit_cache(maxsize):
+    """Replace the split cache with an empty one of the given size (None = unbounded)."""
+    global _split_cached
+    _split_cached = lru_cache(maxsize=maxsize)(_split_stripped)
+
+# Same rules as split_value_and_unit, applied to a whole column with pandas .str operations.
+# num_regex wrapped in an outer group so str.extract returns the full numeric prefix as column 0
+num_prefix_regex = re.compile("(" + num_regex.pattern + ")", re.VERBOSE)
+ratio_value_regex = re.compile(r"\d\s*:\s*1$")
+qual_regex = re.compile(r"(negative|pos|positive|trace|tr|nil|none)", flags=re.I)
+
+def split_values_and_units(series, col_name):
+    """
+    Vectorized split_value_and_unit: returns (float values, unit labels) aligned to series.
+    Raw values repeat heavily, so the string work runs once per distinct stripped value.
+    """
+    values = pd.Series(np.nan, index=series.index, dtype="float64")
+    units = pd.Series("no_units", index=series.index, dtype=object)
+    present = series.notna()
+    if not present.any():
+        return values, units
+    codes, distinct = pd.factorize(series[present].astype(str).str.strip())
+    s = pd.Series(distinct, dtype=object)
+
+    # leading numeric -> float (commas are thousands separators)
+    val = s.str.extract(num_prefix_regex)[0].str.replace(",", "", regex=False).astype("float64")
+
+    # text after the numeric prefix (whole string if there is none), tidied like normalize_unit
+    unit = (
+        s.str.replace(num_regex, "", n=1, regex=True)
+        .str.strip()
+        .str.replace(".", " ", regex=False).str.replace("·", " ", regex=False)
+        .str.replace(r"\s+", " ", regex=True)
+        .str.replace(" /", "/", regex=False).str.replace("/ ", "/", regex=False)
+        .str.replace(" l", "/L", regex=False).str.replace(" L", "/L", regex=False)
+        .str.lower()
+        .str.replace("µ", "u", regex=False)
+        .str.replace("umol/ l", "umol/l", regex=False)
+    )
+
+    if col_name.lower().startswith("ph"):
+        unit = pd.Series("unitless", index=s.index, dtype=object)
+    elif "ratio" in col_name.lower():
+        unit = pd.Series("ratio", index=s.index, dtype=object)
+    else:
+        is_ratio = s.str.contains(ratio_value_regex)
+        is_empty = unit.isin(["", " "])
+        unit = unit.str.strip(" :;").str.replace("mg dl", "mg/dl", regex=False).str.replace("g dl", "g/dl", regex=False)
+        canon = unit.map(UNIT_MAP)
+        # heuristic rescues, in normalize_unit's order (first match wins)
+        rescued = np.select(
+            [
+                canon.notna(),
+                unit.str.contains("umol", regex=False),
+                unit.str.contains("mmol", regex=False),
+                unit.str.contains("iu", regex=False),
+                unit.str.contains("mg", regex=False) & unit.str.contains("dl", regex=False),
+                unit.str.contains("g", regex=False) & unit.str.contains("/l", regex=False),
+                unit.str.contains("osmol", regex=False),
+                unit.str.strip().str.fullmatch(qual_regex),
+            ],
+            [canon, "umol/L", "mmol/L", "IU/L", "mg/dL", "g/L", "mOsmol/kg", "qual"],
+            default=unit.astype(object),
+        )
+        unit = pd.Series(np.where(is_ratio, "ratio", np.where(is_empty, "no_units", rescued)), index=s.index, dtype=object)
+
+    # qualitative only (no number): "unitless" stays, anything else with a unit is "qual"
+    no_number = val.isna()
+    unit = unit.where(~no_number | (unit == "unitless"), np.where(unit == "no_units", "no_units", "qual"))
+    unit = unit.where(~(~no_number & (unit == "")), "no_units")
+
+    values[present] = val.to_numpy()[codes]
+    units[present] = unit.to_numpy()[codes]
+    return values, units